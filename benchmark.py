@@ -0,0 +1,150 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+from featurematrix import FeatureMatrix, DescriptionStore
+from featurestore import load_featuresystem, load_languages
+from search import reccheck, greedy_batch
+from stats import get_general_info_natural_classes
+
+SELECTSYSTEMS = ['riggle', 'hayes']
+SELECTLANGUAGES = ['british_english', 'chinese', 'dutch', 'french']
+ALLSYSTEMS = ['HC_features', 'SPE_features', 'JFH_features', 'UFTc_features']
+# Metrics compared between two runs (per case), and whether they are timings (subject to --min-time)
+METRICS = {'wall_time': True, 'search_time': True, 'greedy_time': True, 'stats_time': True, 'nodes': False, 'peak_memory': False}
+
+def read_language(language):
+    """Read the segments of a language file in phonemic_inventories/."""
+    with open(f"phonemic_inventories/{language}.txt", "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+def run_case(fd, inventory, descriptions):
+    """Search every phoneme of an inventory, then compute the statistics, timing each stage."""
+    start = time.perf_counter()
+    fm = FeatureMatrix(fd, set(inventory))
+    natural_classes = DescriptionStore(fm.features)
+    perphoneme = []
+    searchtime = 0
+    t = time.perf_counter()
+    greedy_batch(fm)
+    greedytime = time.perf_counter() - t
+    for phoneme in sorted(fm.segments):
+        base, feats, modes = fm.specified({phoneme})
+        if base != fm.tomask({phoneme}):
+            continue
+        counters = {}
+        t = time.perf_counter()
+        solutions = reccheck(fm, feats, modes, base, descriptions == 'minimal', counters=counters)
+        elapsed = time.perf_counter() - t
+        searchtime += elapsed
+        found = sum(len(s) for s in solutions.values())
+        perphoneme.append({'phoneme': phoneme, 'features': len(feats), 'time': elapsed, 'nodes': counters['nodes'], 'descriptions': found})
+        natural_classes.add(phoneme, [d for s in solutions.values() for d in s], fm.signmask(feats, modes))
+    t = time.perf_counter()
+    get_general_info_natural_classes(natural_classes)
+    statstime = time.perf_counter() - t
+    return {'segments': len(fm.segments), 'natural_classes': len(perphoneme),
+            'wall_time': time.perf_counter() - start, 'search_time': searchtime, 'greedy_time': greedytime, 'stats_time': statstime,
+            'nodes': sum(p['nodes'] for p in perphoneme), 'descriptions': sum(p['descriptions'] for p in perphoneme),
+            'perphoneme': perphoneme}
+
+def peak_memory(fd, inventory, descriptions):
+    """Peak memory (bytes allocated by Python) of one case, measured in a separate run since tracing slows it down."""
+    tracemalloc.start()
+    run_case(fd, inventory, descriptions)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def cases(sample, seed):
+    """List the (system, language, inventory) cases: the language files and a sample of the 629 languages."""
+    result = []
+    for system in SELECTSYSTEMS:
+        for language in SELECTLANGUAGES:
+            result.append((system, language, read_language(language)))
+    languages = random.Random(seed).sample(load_languages(), sample)
+    for system in ALLSYSTEMS:
+        for language, family, inventory in languages:
+            result.append((system, language, inventory))
+    return result
+
+def run(sample, seed, descriptions, memory, repeat=3):
+    """Run the benchmark and return the results (of the fastest of repeat runs of each case, to reduce noise)."""
+    start = time.perf_counter()
+    results = []
+    systems = {}
+    for system, language, inventory in cases(sample, seed):
+        if system not in systems:
+            systems[system] = load_featuresystem(system)
+        result = {'system': system, 'language': language}
+        result.update(min((run_case(systems[system], inventory, descriptions) for r in range(repeat)), key=lambda r: r['wall_time']))
+        if memory:
+            result['peak_memory'] = peak_memory(systems[system], inventory, descriptions)
+        results.append(result)
+        print(f"{system:14} {language[:30]:30} {result['natural_classes']:4} classes {result['nodes']:10} nodes "
+              f"{result['descriptions']:9} descriptions {result['wall_time']:8.3f}s", file=sys.stderr)
+    return {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                     'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'sample': sample, 'seed': seed, 'descriptions': descriptions,
+                     'repeat': repeat},
+            'total_time': time.perf_counter() - start, 'cases': results}
+
+def compare(old, new, threshold, mintime):
+    """Compare two benchmark results and return the regressions, i.e. metrics that grew by more than threshold."""
+    oldcases = {(case['system'], case['language']): case for case in old['cases']}
+    regressions = []
+    for case in new['cases']:
+        key = (case['system'], case['language'])
+        if key not in oldcases:
+            continue
+        before = oldcases[key]
+        if case['descriptions'] != before['descriptions']:
+            regressions.append(f"{key[0]} {key[1]}: descriptions changed {before['descriptions']} -> {case['descriptions']}")
+        for metric, timing in METRICS.items():
+            if metric not in case or metric not in before:
+                continue
+            if timing and case[metric] < mintime:
+                continue
+            if case[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{key[0]} {key[1]}: {metric} {before[metric]:.4g} -> {case[metric]:.4g} "
+                                   f"({(case[metric] / before[metric] - 1) * 100 if before[metric] else float('inf'):+.0f}%)")
+    if new['total_time'] > old['total_time'] * (1 + threshold):
+        regressions.append(f"total_time {old['total_time']:.4g} -> {new['total_time']:.4g}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the description search on the bundled data.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    runparser = commands.add_parser('run', help='run the benchmark')
+    runparser.add_argument('-o', '--output', default='benchmark.json', help='file to save the results to')
+    runparser.add_argument('--sample', type=int, default=10, help='number of languages sampled from pb_languages_formatted.csv')
+    runparser.add_argument('--seed', type=int, default=0, help='seed of the language sample')
+    runparser.add_argument('--descriptions', choices=['all', 'minimal'], default='all', help='search mode')
+    runparser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest one is kept')
+    runparser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the peak memory measurement')
+    compareparser = commands.add_parser('compare', help='compare two saved runs and flag regressions')
+    compareparser.add_argument('old', help='results of the reference run')
+    compareparser.add_argument('new', help='results of the run to check')
+    compareparser.add_argument('--threshold', type=float, default=0.2, help='relative increase reported as a regression')
+    compareparser.add_argument('--min-time', type=float, default=0.01, help='ignore timings below this many seconds')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.sample, args.seed, args.descriptions, args.memory, args.repeat)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+        print(f"Total time: {results['total_time']:.3f}s", file=sys.stderr)
+    else:
+        with open(args.old) as file:
+            old = json.load(file)
+        with open(args.new) as file:
+            new = json.load(file)
+        regressions = compare(old, new, args.threshold, args.min_time)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
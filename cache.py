@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from search import reccheck
+
+FORMAT = 2 # version of the stored solutions (2: description masks), part of every key
+
+def maximal_patterns(fm, basefeats, basemodes, correct):
+    """
+    The part of the inventory that determines the solutions of the natural class correct.
+    A description is a solution if, for every other segment, it contains a feature where that segment differs from the
+    class. Only the maximal sets of features on which another segment agrees with the class matter, so these patterns
+    (bitmasks over the positions of basefeats, sorted) stand for the inventory: adding a segment whose pattern is
+    contained in one of them, or removing one whose pattern is not maximal, leaves the solutions unchanged.
+    """
+    patterns = [0] * len(fm.segments)
+    for i, (f, m) in enumerate(zip(basefeats, basemodes)):
+        others = fm.masks[f][m] & ~correct
+        while others:
+            low = others & -others
+            patterns[low.bit_length() - 1] |= 1 << i
+            others ^= low
+    others = set(patterns[j] for j in range(len(fm.segments)) if not correct >> j & 1)
+    # A pattern is maximal if no larger one contains it, so it is enough to compare it with the maximal ones found so far
+    maximal = []
+    for p in sorted(others, key=int.bit_count, reverse=True):
+        if not any(p & q == p for q in maximal):
+            maximal.append(p)
+    return sorted(maximal)
+
+class ResultCache:
+    """
+    On-disk cache of branch-and-bound solutions, stored in an SQLite database inside the cache directory.
+    Entries are keyed by a hash of the contents of the feature system fd (named system), the target phoneme and the part
+    of the inventory that matters for its search, so languages that share a phoneme neighbourhood share the entry, and so
+    do the same system read from its .txt file or from ipa2allfeatures.csv. Entries of an older version of the feature
+    system are removed when the cache is opened, and the least recently used entries are evicted once the cache grows
+    beyond maxsize bytes. Every write is committed right away, so the processes of a parallel run never hold the
+    database locked during a search; reads only note their key, and the times of use are written by commit.
+    """
+
+    def __init__(self, directory, system, fd, maxsize=1024 ** 3):
+        os.makedirs(directory, exist_ok=True)
+        self.maxsize = maxsize
+        self.system = system
+        self.systemhash = fd.contenthash()
+        self.db = sqlite3.connect(os.path.join(directory, 'results.sqlite'), timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL') # let the worker processes of a parallel run read while another one writes
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, system TEXT, systemhash TEXT,
+                           solutions TEXT, size INTEGER, last_used REAL)''')
+        # Invalidate the entries computed with a previous version of the feature system
+        self.db.execute('DELETE FROM results WHERE system = ? AND systemhash != ?', (self.system, self.systemhash))
+        self.db.commit()
+        self.used = {} # time of use of the keys read since the last commit
+
+    def key(self, fm, basefeats, basemodes, correct, minimal):
+        """Hash the inputs that determine the solutions of the natural class correct (see maximal_patterns)."""
+        maximal = maximal_patterns(fm, basefeats, basemodes, correct)
+        content = json.dumps([FORMAT, self.systemhash, sorted(fm.tosegments(correct)), basefeats, basemodes, minimal, maximal], ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached solutions for key, or None if they are not cached."""
+        row = self.db.execute('SELECT solutions FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.used[key] = time.time()
+        return {length: descriptions for length, descriptions in json.loads(row[0])}
+
+    def put(self, key, solutions):
+        """Store the solutions for key, committing at once."""
+        value = json.dumps(list(solutions.items()), ensure_ascii=False)
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, self.system, self.systemhash, value, len(value.encode('utf-8')), time.time()))
+        self.db.commit()
+
+    def commit(self):
+        """Write the times of use of the entries read and evict the least recently used entries beyond the size cap."""
+        if self.used:
+            self.db.executemany('UPDATE results SET last_used = ? WHERE key = ?', [(used, key) for key, used in self.used.items()])
+            self.used = {}
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total > self.maxsize:
+            removed = []
+            for key, size in self.db.execute('SELECT key, size FROM results ORDER BY last_used'):
+                if total <= self.maxsize:
+                    break
+                removed.append((key,))
+                total -= size
+            self.db.executemany('DELETE FROM results WHERE key = ?', removed)
+        self.db.commit()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+class SearchMemo:
+    """
+    In-memory store of the solutions of the searches of one feature system, shared by all the languages analysed in a
+    process. Entries are keyed like the ResultCache (target phoneme, features and maximal patterns), so a language with
+    the same inventory as one analysed before reuses all its solutions, and one that differs in a few segments only
+    searches again the phonemes whose patterns those segments change. The least recently used entries are dropped once
+    the solutions stored hold more than maxsize descriptions.
+    """
+
+    def __init__(self, maxsize=10 ** 6):
+        self.maxsize = maxsize
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def key(self, fm, basefeats, basemodes, correct, minimal):
+        return (frozenset(fm.tosegments(correct)), tuple(basefeats), tuple(basemodes), minimal,
+                tuple(maximal_patterns(fm, basefeats, basemodes, correct)))
+
+    def get(self, key):
+        """Return the stored solutions for key, or None if they are not stored."""
+        solutions = self.entries.get(key)
+        if solutions is not None:
+            self.entries.move_to_end(key)
+        return solutions
+
+    def put(self, key, solutions):
+        """Store the solutions for key, dropping the least recently used entries beyond the size cap."""
+        self.entries[key] = solutions
+        self.size += sum(len(descriptions) for descriptions in solutions.values())
+        while self.size > self.maxsize and len(self.entries) > 1:
+            key, old = self.entries.popitem(last=False)
+            self.size -= sum(len(descriptions) for descriptions in old.values())
+
+def cached_reccheck(cache, fm, basefeats, basemodes, correct, minimal=False, verbose=False, counters=None, budget=None, memo=None):
+    """
+    Run reccheck, reusing the solutions stored in memo (a SearchMemo) or cache (if any), in that order. Hits are counted
+    in counters under 'cache_hits'. Searches cut short by the budget are not stored.
+    """
+    memokey = None
+    solutions = None
+    if memo is not None:
+        memokey = memo.key(fm, basefeats, basemodes, correct, minimal)
+        solutions = memo.get(memokey)
+    if solutions is None and cache is not None:
+        key = cache.key(fm, basefeats, basemodes, correct, minimal)
+        solutions = cache.get(key)
+        if solutions is not None and memo is not None:
+            memo.put(memokey, solutions)
+    if solutions is None:
+        solutions = reccheck(fm, basefeats, basemodes, correct, minimal, verbose, counters, budget=budget)
+        if budget is None or not budget.exhausted:
+            if cache is not None:
+                cache.put(key, solutions)
+            if memo is not None:
+                memo.put(memokey, solutions)
+        return solutions
+    if budget is not None:
+        budget.exhausted = False
+    if counters is not None:
+        counters['cache_hits'] = counters.get('cache_hits', 0) + 1
+    if verbose:
+        plus = fm.signmask(basefeats, basemodes)
+        for descriptions in solutions.values():
+            for description in descriptions:
+                print(fm.format(description, plus))
+    return solutions
@@ -0,0 +1,173 @@
+import argparse
+import json
+import numpy as np
+from featurestore import load_languages
+from resultstream import iter_results
+
+# Per-language statistics exported as language-by-feature columns
+FEATURE_STATS = ['min_lengths', 'avg_lengths', 'count_phoneme']
+
+def read_results(path):
+    """
+    Iterate over the (language, family, info) records of a results file: a JSON-lines stream written by
+    featureinfo_alllanguages.py, or a JSON dictionary indexed by language (the format of results/), whose families are
+    taken from pb_languages_formatted.csv.
+    """
+    if path.endswith('.jsonl'):
+        yield from iter_results(path)
+        return
+    families = {language: family for language, family, inventory in load_languages()}
+    with open(path) as file:
+        for language, info in json.load(file).items():
+            yield language, families.get(language, ''), info
+
+def export(path, npzpath):
+    """
+    Export a results file to a NumPy .npz file of columns:
+        language, family: one entry per language
+        feature: feature names, the columns of the statistics
+        min_lengths, avg_lengths: language-by-feature float arrays (NaN where the feature is not in any description)
+        count_phoneme: language-by-feature int array
+        count_lengths: language-by-length int array, the number of minimal descriptions of each length
+        description_language, description_phoneme, description: one row per minimal description, with the index of its
+            language, the index of its phoneme in phoneme and its features (+1 for '+', -1 for '-', 0 if not used)
+    Statistics missing from the results (e.g. runs with --minimal-only) are left out.
+    """
+    languages, families = [], []
+    features = {} # column of each feature, in order of first appearance
+    phonemes = {} # index of each phoneme
+    stats = {name: [] for name in FEATURE_STATS + ['count_lengths']}
+    descriptions = [] # (language, phoneme, labels)
+    for language, family, info in read_results(path):
+        index = len(languages)
+        languages.append(language)
+        families.append(family)
+        for name in stats:
+            if name in info:
+                stats[name].append((index, info[name]))
+                if name != 'count_lengths':
+                    for feature in info[name]:
+                        features.setdefault(feature, len(features))
+        for phoneme, phonemedescriptions in info.get('min_descriptions', {}).items():
+            phonemes.setdefault(phoneme, len(phonemes))
+            for labels in phonemedescriptions:
+                descriptions.append((index, phonemes[phoneme], labels))
+                for label in labels:
+                    features.setdefault(label[1:], len(features))
+
+    columns = {'language': np.array(languages), 'family': np.array(families), 'feature': np.array(list(features)),
+               'phoneme': np.array(list(phonemes))}
+    for name in FEATURE_STATS:
+        if not stats[name]:
+            continue
+        if name == 'count_phoneme':
+            values = np.zeros((len(languages), len(features)), dtype=np.int64)
+        else:
+            values = np.full((len(languages), len(features)), np.nan)
+        for index, values_of_language in stats[name]:
+            for feature, value in values_of_language.items():
+                values[index, features[feature]] = value
+        columns[name] = values
+    if stats['count_lengths']:
+        longest = max((int(length) for index, histogram in stats['count_lengths'] for length in histogram), default=0)
+        values = np.zeros((len(languages), longest + 1), dtype=np.int64)
+        for index, histogram in stats['count_lengths']:
+            for length, count in histogram.items():
+                values[index, int(length)] = count
+        columns['count_lengths'] = values
+    matrix = np.zeros((len(descriptions), len(features)), dtype=np.int8)
+    for row, (index, phoneme, labels) in enumerate(descriptions):
+        for label in labels:
+            matrix[row, features[label[1:]]] = 1 if label[0] == '+' else -1
+    columns['description_language'] = np.array([d[0] for d in descriptions], dtype=np.int32)
+    columns['description_phoneme'] = np.array([d[1] for d in descriptions], dtype=np.int32)
+    columns['description'] = matrix
+    np.savez_compressed(npzpath, **columns)
+
+def rankings(columns, groups=None):
+    """
+    Rank the features by informativity over the languages of each group (all languages if groups is None).
+    groups: array with the group of each language. Returns a dictionary with the ranking of each group: a list, from the
+    most to the least informative feature, of its number of languages (those with the feature in a description), its
+    mean minimal description length, mean description length and share of the minimal descriptions that use it.
+    Features are ranked by mean minimal description length, then by that share (descending).
+    """
+    features = columns['feature']
+    if groups is None:
+        groups = np.zeros(len(columns['language']), dtype=int)
+        names = np.array(['all'])
+    else:
+        names, groups = np.unique(groups, return_inverse=True)
+    ngroups = len(names)
+
+    def groupsum(values):
+        """Sum the language-by-feature rows of values by group."""
+        sums = np.zeros((ngroups,) + values.shape[1:], dtype=values.dtype)
+        np.add.at(sums, groups, values)
+        return sums
+
+    result = {}
+    stats = {}
+    if 'min_lengths' in columns:
+        present = ~np.isnan(columns['min_lengths'])
+        stats['languages'] = groupsum(present.astype(np.int64))
+        stats['mean_min_length'] = groupsum(np.nan_to_num(columns['min_lengths'])) / np.maximum(stats['languages'], 1)
+        stats['mean_min_length'][stats['languages'] == 0] = np.nan
+    if 'avg_lengths' in columns:
+        averages = columns['avg_lengths']
+        counted = ~np.isnan(averages) & (averages != 0) # avg_lengths is 0 for features without descriptions
+        counts = groupsum(counted.astype(np.int64))
+        stats['mean_avg_length'] = groupsum(np.where(counted, averages, 0)) / np.maximum(counts, 1)
+        stats['mean_avg_length'][counts == 0] = np.nan
+    # Every row of description uses a feature at most once, so the share of the minimal descriptions using a feature
+    # is its number of rows over the number of rows of the group
+    used = columns['description'] != 0
+    descriptiongroups = groups[columns['description_language']]
+    totals = np.bincount(descriptiongroups, minlength=ngroups)
+    usage = np.zeros((ngroups, len(features)), dtype=np.int64)
+    np.add.at(usage, descriptiongroups, used.astype(np.int64))
+    stats['share'] = usage / np.maximum(totals, 1)[:, None]
+    for g, name in enumerate(names):
+        primary = stats['mean_min_length'][g] if 'mean_min_length' in stats else np.zeros(len(features))
+        order = np.lexsort((-stats['share'][g], np.nan_to_num(primary, nan=np.inf)))
+        ranking = []
+        for j in order:
+            if stats['share'][g, j] == 0 and ('languages' not in stats or stats['languages'][g, j] == 0):
+                continue # feature that no language of the group uses
+            entry = {'feature': str(features[j])}
+            for stat, values in stats.items():
+                value = values[g, j]
+                entry[stat] = int(value) if values.dtype.kind == 'i' else (None if np.isnan(value) else float(value))
+            ranking.append(entry)
+        result[str(name)] = ranking
+    return result
+
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export results to NumPy columns and rank the features across languages.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    exportparser = commands.add_parser('export', help='export a results file (.jsonl stream or .json dictionary) to .npz')
+    exportparser.add_argument('results', help='results file, e.g. data_all_languages_HC_features.jsonl')
+    exportparser.add_argument('npz', help='output .npz file')
+    aggregateparser = commands.add_parser('aggregate', help='rank the features of an exported file across languages')
+    aggregateparser.add_argument('npz', help='file written by export')
+    aggregateparser.add_argument('--by', choices=['all', 'family'], default='all', help='rank over all languages or per family')
+    aggregateparser.add_argument('--top', type=int, default=10, help='number of features printed per group')
+    aggregateparser.add_argument('-o', '--output', help='write the full rankings to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export(args.results, args.npz)
+    else:
+        with np.load(args.npz) as data:
+            columns = dict(data)
+        result = rankings(columns, columns['family'] if args.by == 'family' else None)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(result, file, ensure_ascii=False)
+        for group, ranking in result.items():
+            print(f"{group}:")
+            for entry in ranking[:args.top]:
+                print(f"  {entry['feature']:30} " + ' '.join(f"{stat}={value:.3f}" if isinstance(value, float) else f"{stat}={value}"
+                                                          for stat, value in entry.items() if stat != 'feature'))
@@ -0,0 +1,79 @@
+from featurematrix import FeatureMatrix
+from featurestore import load_featuresystem
+from naturalclass import ClassQuery, load_inventory
+from search import reccheck, mincover, greedy
+
+MODES = ['minimum', 'minimal', 'all'] # searches of describe: mincover, irredundant descriptions, exhaustive search
+
+class Engine:
+    """
+    Description search for one feature system, loaded once and reused for any number of queries.
+    The feature matrix and the natural-class queries of every language asked for are kept, so only the first query of
+    a language compiles its inventory. Nothing is stored outside the instance.
+    """
+
+    def __init__(self, inventoryfile):
+        self.inventoryfile = inventoryfile
+        self.fd = load_featuresystem(inventoryfile)
+        self.matrices = {} # FeatureMatrix of each language queried so far
+        self.queries = {} # ClassQuery of each language queried so far
+
+    def inventory(self, language):
+        """
+        Segments of a language: a file in phonemic_inventories/, a language of pb_languages_formatted.csv, or 'all' for
+        every segment of the feature system. Raises KeyError for an unknown language.
+        """
+        if language == 'all':
+            return list(self.fd.segments)
+        return load_inventory(language)
+
+    def matrix(self, language):
+        """FeatureMatrix of a language, compiled on first use."""
+        if language not in self.matrices:
+            self.matrices[language] = FeatureMatrix(self.fd, set(self.inventory(language)))
+        return self.matrices[language]
+
+    def describe(self, phoneme, language, descriptions='minimum'):
+        """
+        Describe one phoneme of a language.
+        Args:
+            descriptions: 'minimum' for the minimum descriptions only (mincover), 'minimal' for the irredundant ones or
+                'all' for every description of the exhaustive search
+        Returns:
+            dictionary with the features that describe the phoneme, whether it is a natural class and, if it is, the
+            descriptions found by length, the minimum descriptions and the greedy description
+        """
+        if descriptions not in MODES:
+            raise ValueError(f"descriptions must be one of {', '.join(MODES)}")
+        fm = self.matrix(language)
+        if phoneme not in fm.index:
+            raise ValueError(f'{phoneme} is not a segment of {language}')
+        base, feats, modes = fm.specified({phoneme})
+        plus = fm.signmask(feats, modes)
+        answer = {'system': self.inventoryfile, 'language': language, 'phoneme': phoneme,
+                  'features': [m + f for f, m in zip(feats, modes)], 'natural_class': base == fm.tomask({phoneme})}
+        if answer['natural_class']:
+            if descriptions == 'minimum':
+                solutions = mincover(fm, feats, modes, base)
+            else:
+                solutions = reccheck(fm, feats, modes, base, descriptions == 'minimal')
+            answer['descriptions'] = {length: [fm.labels(d, plus) for d in solutions[length]] for length in solutions}
+            answer['min_descriptions'] = answer['descriptions'][min(solutions)]
+            answer['greedy'] = greedy(fm, feats, modes, base)
+        return answer
+
+    def classes(self, segmentsets, language):
+        """
+        Answer ClassQuery.query for every set of segments of a language, in order. A set that cannot be answered (e.g.
+        with segments outside the inventory) gets an 'error' message instead, like in naturalclass.py, and the other
+        sets are still answered.
+        """
+        if language not in self.queries:
+            self.queries[language] = ClassQuery(self.fd, self.inventory(language))
+        answers = []
+        for segments in segmentsets:
+            try:
+                answers.append(self.queries[language].query(segments))
+            except (ValueError, TypeError) as error:
+                answers.append({'error': str(error)})
+        return answers
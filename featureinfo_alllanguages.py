@@ -1,265 +1,272 @@
-import sys
-import pandas as pd
+import argparse
+import multiprocessing
+import threading
 from tqdm import tqdm
-import json
+from featurematrix import FeatureMatrix, DescriptionStore
+from featurestore import load_featuresystem, load_allfeatures, allfeatures_systems, load_languages
+from resultstream import ResultWriter, tojson
+from cache import ResultCache, SearchMemo, cached_reccheck
+from plotting import plot_phonemes, render_plots
+from stats import get_general_info_natural_classes
+from search import Budget, greedy_batch, minimal_only
+from schedule import language_cost, longest_first
+from tracing import Tracer, start_event, phoneme_event, language_event
 import os
-import matplotlib.pyplot as plt
+import time
 
-def readinventory(filename):
-    """Read phoneme inventory and store in a dictionary."""
-    featdict = {}
-    allsegments = set()
+# Fields of the output that only depend on the minimum descriptions, the ones computed with --minimal-only
+MINIMAL_FIELDS = ['min_descriptions', 'count_phoneme', 'count_lengths']
 
-    lines = [line.strip() for line in open(f'feature_sets/{filename}.txt')]
-    fields = lines[0].split()
-    for f in fields:
-        featdict[f] = {}
-        featdict[f]['name'] = f # name of the feature
-        featdict[f]['+'] = set() # phonemes with a + for that feature
-        featdict[f]['-'] = set() # phonemes with a - for that feature
-    for i in range(1, len(lines)):
-        thisline = lines[i]
-        if len(thisline) == 0:
-            continue
-        linefields = thisline.split()
-        if len(linefields)!= len(fields) + 1 :
-            print(f"Field length mismatch on line {i+1}")
-            quit()
-        phoneme = linefields[0]
-        allsegments |= {phoneme}
-        for j in range(1,len(linefields)):
-            if linefields[j] == '+' or linefields[j] == '-':
-                featdict[fields[j-1]][linefields[j]] |= {phoneme}
-
-    return featdict, allsegments
-
-def reccheck(fd, basefeats, basemodes, feats, modes, correct, baseindex):
+def analyse_language(fd, language, inventory, inventoryfile, descriptions, verbose, progress=True, cache=None, plots='none', trace=None, budget=None, memo=None):
     """
-    Start with an empty set of features and keep adding features one by one with different starting phonemes, generating all possible unique feature combinations.
-    Check if the generated feature combinations are natural classes for the given phoneme.
+    Find the natural classes of every phoneme of one language and compute their descriptive information.
+    The per-phoneme plots are rendered right away (plots='inline'), returned as data (plots='deferred') or skipped.
+    trace: function called with every trace event as soon as it happens (a start event for the language and for each
+    phoneme, then the timed and counted search of the phoneme and the language), or None to trace nothing.
+    With descriptions='minimum' (--minimal-only) only the minimum descriptions are searched and only the fields that
+    depend on them are returned. With a Budget, the search of each phoneme stops when it runs out and the phonemes whose
+    descriptions are incomplete are listed under 'incomplete'. With a SearchMemo, the searches already done for another
+    language with the same phoneme neighbourhood are reused.
     """
+    start = time.perf_counter() if trace else None
+    events = [] if trace else None # phoneme events, summed in the language event
+    allsegments = sorted(set(inventory)) # fixed order, so the output does not depend on the hash seed
+    if trace:
+        trace(start_event(language, len(allsegments)))
+    fm = FeatureMatrix(fd, allsegments) # bitmask representation of the feature dictionary for this inventory
 
-    def store_feats(fd, feats, modes):
-        """Store features for one solution in dictionary indexed by length."""
-        global solutions
-        length = len(feats)
-        if length not in solutions:
-            solutions[length] = []
-        thissol = []
-        for idx, feat in enumerate(feats):
-            thissol.append(modes[idx] + fd[feat]['name'])
-        solutions[length].append('[' + ','.join(thissol) + ']')
-        if verbose:
-            print('[' + ','.join(thissol) + ']')
-            
-    def check_feats(fd, feats, modes, correct):
-        """Check if proposed feature combination is a valid solution."""
-        newbase = allsegments
-        for idx, feat in enumerate(feats):
-            mode = modes[idx]
-            newbase = newbase & fd[feat][mode]
-        if newbase != correct:
-            return False
-        return True
-        
-    global maxlen
-    if len(feats) > maxlen: # Bound the search (max: total amount of features)
-        return
-    if check_feats(fd, feats, modes, correct): # New solution
-        store_feats(fd, feats, modes) # if proposed feature combination is a natural class, store solution
-        if len(feats) < maxlen:
-            maxlen = len(feats)
-    numelem = len(basefeats)
-    # This for loop iterates over all possible indeces and generates all possible feature combinations
-    for i in range(baseindex, numelem):  # Add one feature
-        if basefeats[i] not in feats:    # If we didn't add this already
-            reccheck(fd, basefeats, basemodes, feats + [basefeats[i]], modes + [basemodes[i]], correct, i + 1)
-    return
-
-def greedy(fd, basefeats, basemodes, correct):
-    """Implement greedy search based on C."""
-    feats = []
-    modes = []
-    currentset = allsegments
-    bestfeatures = []
-    # Find most distinguishing feature
-    while True:
-        sols = []
-        if verbose:
-            print("===============================")
-        for f,m in zip(basefeats, basemodes):
-            extrasegs = (currentset & fd[f][m]) - correct
-            length = len(extrasegs)
-            if verbose:
-                print("Len of " + fd[f]['name'] + " is " + str(length))
-            sols.append((extrasegs, fd[f]['name'], length, m))
-        bestsol = min(sols, key = lambda x: x[2])
-        currentset = bestsol[0]
-        bestfeatures.append(bestsol[3] + bestsol[1])
-
-        if bestsol[2] == 0:
-            break
-    print("Greedy solution:", bestfeatures)
+    natural_classes = DescriptionStore(fm.features) # descriptions of each phoneme, as packed masks
+    incomplete = [] # phonemes whose search ran out of budget
+    greedies = greedy_batch(fm) if descriptions == 'minimum' else None # upper bounds of the minimum descriptions
+    for testset in tqdm(allsegments, disable=not progress):
+        testset = {testset}
 
-def get_general_info_natural_classes(natural_classes, keys):
-    if not os.path.exists(f'{language}_perphoneme_{inventoryfile}'):
-        os.makedirs(f'{language}_perphoneme_{inventoryfile}')
+        # Find:
+            # base: mask of phonemes that are described by the same features as the given test phoneme
+            # feats: list of features that describe the given phoneme
+            # modes: list with the respective signs of the features describing the given phoneme
+        base, feats, modes = fm.specified(testset)
 
-    min_lengths = {} # store the length of the minimal description where each feature is included
-    min_lengths_phonemes = {}
-    avg_lengths = {key: [0,0] for key in keys} # store the average lengths of all descriptions per phoneme
+        # Check if the procedure above has resulted in the phoneme being tested (i.e. we have the correct general feature description and it is a natural class)
+        if base == fm.tomask(testset): 
+            if trace:
+                trace(start_event(language, phoneme=list(testset)[0]))
+            counters = {} if trace else None
+            t = time.perf_counter() if trace else None
+            if descriptions == 'minimum':
+                solutions = minimal_only(fm, feats, modes, base, verbose, counters, len(greedies[list(testset)[0]]))
+            else:
+                solutions = cached_reccheck(cache, fm, feats, modes, base, descriptions == 'minimal', verbose, counters, budget, memo)
+                if budget is not None and budget.exhausted:
+                    incomplete.append(list(testset)[0])
+            if trace:
+                events.append(phoneme_event(language, list(testset)[0], feats, time.perf_counter() - t, counters, solutions))
+                trace(events[-1])
+            # The statistics have always left out the first description of every phoneme
+            natural_classes.add(list(testset)[0], [a for s in solutions.values() for a in s][1:], fm.signmask(feats, modes))
 
-    for phoneme in natural_classes:
-        for sublist in natural_classes[phoneme]:
-            sublist = sublist.strip("[]").split(',')
-            # Iterate through each unique value
-            for value in sublist:
-                value = value.strip('+') # remove + symbols
-                value = value.strip('-') # remove - symbols
-                # Check if the value already exists in the dictionary
-                if value in min_lengths:
-                    # If the length of the current sublist is smaller than the stored length,
-                    # update the stored length
-                    min_lengths[value] = min(min_lengths[value], len(sublist))
-                else:
-                    # If the value doesn't exist in the dictionary, add it with the length
-                    min_lengths[value] = len(sublist)
+    if trace:
+        searchtime = time.perf_counter() - start
+    min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths, phonemeplots = get_general_info_natural_classes(natural_classes)
+    if trace:
+        elapsed = time.perf_counter() - start
+        trace(language_event(language, len(allsegments), elapsed, searchtime, elapsed - searchtime, events))
+    if plots == 'inline':
+        plot_phonemes(language, inventoryfile, phonemeplots)
+    info = {'min_lengths': min_lengths, 'min_descriptions': min_descriptions, 
+            'count_phoneme': count_phoneme, 'avg_lengths': avg_lengths, 'count_lengths': count_lengths}
+    if descriptions == 'minimum':
+        info = {field: info[field] for field in MINIMAL_FIELDS}
+    if incomplete:
+        info['incomplete'] = sorted(incomplete)
+    return info, phonemeplots if plots == 'deferred' else None
 
-                if value in avg_lengths:
-                    avg_lengths[value][0] += len(sublist)
-                    avg_lengths[value][1] += 1
-            
-            if phoneme in min_lengths_phonemes:
-                min_lengths_phonemes[phoneme] = min(min_lengths_phonemes[phoneme], len(sublist))
-            else: 
-                min_lengths_phonemes[phoneme] = len(sublist)
-        
-        aux_plotting_function(min_lengths, f"Phoneme {phoneme}", 'Feature', 'Length minimal feature description', f'{language}_perphoneme_{inventoryfile}/{phoneme}.jpg', False)
-                
-    avg_lengths = {k: v[0] / v[1] if v[1] != 0 else 0 for k, v in avg_lengths.items()}
+def load_systems(inventoryfile, allfeatures):
+    """
+    Load the feature systems of a run by name: the system of feature_sets/{inventoryfile}.txt, or the systems
+    allfeatures of ipa2allfeatures.csv (all of them if empty), named SYSTEM_features like their .txt files.
+    """
+    if allfeatures is None:
+        return {inventoryfile: load_featuresystem(inventoryfile)}
+    return {f'{system}_features': fd for system, fd in load_allfeatures(allfeatures or None).items()}
 
-    min_descriptions = {} # store the minimal descriptions of each phoneme
-    # get all minimal descriptions per phoneme
-    for phoneme in natural_classes:
-        if phoneme not in min_descriptions:
-            min_descriptions[phoneme] = []
+def analyse_systems(systems, caches, task, descriptions, verbose, progress=True, plots='none', trace=None, budget=None, memos=None):
+    """
+    Run analyse_language for one (language, family, inventory, names) task under each of the systems in names, with the
+    caches and memos (SearchMemo) of the systems, if any. The trace events are passed to trace tagged with their system.
+    Returns the list of the results of the systems, after committing their caches.
+    """
+    language, family, inventory, names = task
+    results = []
+    for name in names:
+        cache = caches.get(name)
+        systemtrace = (lambda event, name=name: trace({**event, 'system': name})) if trace else None
+        results.append(analyse_language(systems[name], language, inventory, name, descriptions, verbose,
+                                        progress=progress, cache=cache, plots=plots, trace=systemtrace, budget=budget,
+                                        memo=(memos or {}).get(name)))
+        if cache is not None:
+            cache.commit()
+    return results
 
-        for sublist in natural_classes[phoneme]:
-            sublist = sublist.strip("[]").split(',')
-            if min_lengths_phonemes[phoneme] == len(sublist):
-                min_descriptions[phoneme].append(sublist)
+# State of each worker process, loaded once by init_worker instead of being pickled with every task
+worker = {}
 
-    count_phoneme = {} # The number of times the feature is included in the minimal description of a phoneme
-    count_lengths = {} # Count of minimal descriptions for various lengths
-    # count features in minimal descriptions          
-    for phoneme in min_descriptions:
-        for sublist in min_descriptions[phoneme]:
-            for value in sublist:
-                value = value.strip('+') # remove + symbol
-                value = value.strip('-') # remove - symbol
-                if value in count_phoneme:
-                    count_phoneme[value] += 1
-                else:
-                    count_phoneme[value] = 1
-    
-            if len(sublist) in count_lengths:
-                count_lengths[len(sublist)] += 1
-            else:
-                count_lengths[len(sublist)] = 1
-    
-    return min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths
+def init_worker(inventoryfile, allfeatures, descriptions, verbose, cachedir, cachesize, plots, tracequeue, budget, memosize):
+    """
+    Load the feature systems (and open their result caches and memos) once per worker process. The trace events are
+    put on tracequeue (if given) as they happen, for the main process to write.
+    """
+    worker['systems'] = load_systems(inventoryfile, allfeatures)
+    worker['caches'] = {name: ResultCache(cachedir, name, fd, cachesize) for name, fd in worker['systems'].items()} if cachedir else {}
+    worker['memos'] = {name: SearchMemo(memosize) for name in worker['systems']} if memosize else {}
+    worker['descriptions'] = descriptions
+    worker['verbose'] = verbose
+    worker['plots'] = plots
+    worker['trace'] = tracequeue.put if tracequeue is not None else None
+    worker['budget'] = budget
 
-def aux_plotting_function(values, title, xlabel, ylabel, path, xint):
-    """Plot the given variables."""
-    values = dict(sorted(values.items(), key=lambda item: item[1]))
-    classes = list(values.keys())
-    counts = list(values.values())
+def analyse_systems_worker(indexedtasks):
+    """
+    Run analyse_systems for a list of (index, task) pairs inside a worker process, one after the other so that they
+    share its memos, returning the list of the indices with the results.
+    """
+    return [(index, analyse_systems(worker['systems'], worker['caches'], task, worker['descriptions'], worker['verbose'],
+                                    progress=False, plots=worker['plots'], trace=worker['trace'], budget=worker['budget'],
+                                    memos=worker['memos']))
+            for index, task in indexedtasks]
 
-    # Plot the histogram
-    plt.bar(classes, counts, width=0.8)
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    if xint: plt.locator_params(axis="x", integer=True)
-    else: plt.xticks(rotation=90)
-    plt.savefig(path, bbox_inches='tight')
-    plt.close()
+def group_tasks(tasks):
+    """
+    Group the indices of the tasks that search the same inventory (as a set of segments) under the same systems, in the
+    order of their first task, so that each group can run in one process and its searches are only done once.
+    """
+    groups = {}
+    for i, (language, family, inventory, names) in enumerate(tasks):
+        groups.setdefault((frozenset(inventory), tuple(names)), []).append(i)
+    return list(groups.values())
 
 ##############################################################################
 
-if len(sys.argv) < 1:
-    print("Usage: " + sys.argv[0] + " [-v] inventoryfile")
-    quit()
-
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-v', dest='verbose', action='store_true', help='print every description found')
+    parser.add_argument('--descriptions', choices=['all', 'minimal'], default='all',
+                        help='all: every description found by the exhaustive search; minimal: only irredundant descriptions')
+    parser.add_argument('--minimal-only', action='store_true',
+                        help='only search the minimum descriptions and only output min_descriptions, count_phoneme and count_lengths (no cache, no plots)')
+    parser.add_argument('--systems', nargs='*', metavar='SYSTEM',
+                        help='instead of one feature system, run the given systems of ipa2allfeatures.csv (default: all of them) in one pass, '
+                             'with one output file per system')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes (0: one per CPU core)')
+    parser.add_argument('--cache', metavar='DIR', help='directory of the on-disk cache of search results (default: no cache)')
+    parser.add_argument('--cache-size', type=int, default=1024, help='maximum size of the cache in MB')
+    parser.add_argument('--memo-size', type=int, default=10 ** 6,
+                        help='maximum number of descriptions kept in memory per system (and process) to reuse the searches of '
+                             'languages with the same phoneme neighbourhood (0: no reuse)')
+    parser.add_argument('--max-nodes', type=int, help='stop the search of a phoneme after this many nodes and mark it as incomplete')
+    parser.add_argument('--max-seconds', type=float, help='stop the search of a phoneme after this many seconds and mark it as incomplete')
+    parser.add_argument('--resume', action='store_true', help='keep the languages already in the output file and only compute the rest')
+    parser.add_argument('--json', action='store_true', help='also write all languages as a single JSON dictionary at the end')
+    parser.add_argument('--plots', choices=['none', 'deferred', 'inline'], default='none',
+                        help='per-phoneme plots: none; deferred: store the plot data and render it after the sweep; inline: render during the sweep')
+    parser.add_argument('--trace', metavar='FILE', help='write a JSON-lines trace of the search of every phoneme and language, and print the slowest ones at the end')
+    parser.add_argument('--trace-top', type=int, default=10, help='number of slowest languages and phonemes in the trace summary')
+    parser.add_argument('inventoryfile', nargs='?', help='feature system in feature_sets/, e.g. HC_features')
+    args = parser.parse_args()
+    if (args.inventoryfile is None) == (args.systems is None):
+        parser.error('give either a feature system or --systems')
+    if args.systems:
+        unknown = sorted(set(args.systems) - set(allfeatures_systems()))
+        if unknown:
+            parser.error(f"unknown systems {', '.join(unknown)} (ipa2allfeatures.csv has {', '.join(allfeatures_systems())})")
+    if args.minimal_only and args.descriptions == 'minimal':
+        parser.error('--minimal-only reproduces the output of --descriptions all')
+    if args.minimal_only and args.plots != 'none':
+        parser.error('--minimal-only does not compute the data of the plots')
+    if args.minimal_only and (args.max_nodes is not None or args.max_seconds is not None):
+        parser.error('--max-nodes and --max-seconds limit the exhaustive search, which --minimal-only does not run')
+    if args.memo_size < 0:
+        parser.error('--memo-size must not be negative')
+    if (args.max_nodes is not None and args.max_nodes < 1) or (args.max_seconds is not None and args.max_seconds <= 0):
+        parser.error('--max-nodes and --max-seconds must be positive')
+    descriptions = 'minimum' if args.minimal_only else args.descriptions
+    budget = Budget(args.max_nodes, args.max_seconds) if args.max_nodes is not None or args.max_seconds is not None else None
 
-verbose = False
-i = 1
-if sys.argv[1] == '-v':
-    verbose = True
-    i += 1
+    systems = load_systems(args.inventoryfile, args.systems) # compiles the feature systems before any worker maps them
+    names = list(systems)
+    # One JSON line is appended per language as soon as it is done, in any order, so a crash only loses the languages
+    # in progress; each record is written with the position of its language, in which order the results are read back
+    writers = {name: ResultWriter(f'data_all_languages_{name}.jsonl', args.resume) for name in names}
+    plotfiles = {name: f'data_all_languages_{name}_plots.jsonl' for name in names}
+    plotwriters = {name: ResultWriter(plotfiles[name], args.resume) for name in names} if args.plots == 'deferred' else {}
+    # Each language is read once and searched under every system that does not have it yet
+    tasks = []
+    positions = [] # position of the language of each task in pb_languages_formatted.csv
+    for position, (language, family, inventory) in enumerate(load_languages()):
+        todo = [name for name in names if language not in writers[name].done]
+        if todo:
+            tasks.append((language, family, inventory, todo))
+            positions.append(position)
+    jobs = args.jobs or os.cpu_count()
+    cachesize = args.cache_size * 1024 ** 2
+    tracer = None
+    if args.trace:
+        tracer = Tracer(args.trace, args.trace_top, script='featureinfo_alllanguages', inventoryfile=','.join(names),
+                        descriptions=descriptions, jobs=jobs, languages=len(tasks))
+    caches = {}
+    if jobs == 1:
+        if args.cache:
+            caches = {name: ResultCache(args.cache, name, fd, cachesize) for name, fd in systems.items()}
+        memos = {name: SearchMemo(args.memo_size) for name in names} if args.memo_size else {}
+        trace = (lambda event: tracer.write([event])) if tracer is not None else None
+        results = ((i, analyse_systems(systems, caches, task, descriptions, args.verbose, plots=args.plots, trace=trace,
+                                       budget=budget, memos=memos))
+                   for i, task in enumerate(tasks))
+    else:
+        # The workers send their trace events through a queue, written by a thread of the main process as they arrive
+        tracequeue = multiprocessing.Queue() if tracer is not None else None
+        if tracer is not None:
+            tracethread = threading.Thread(target=lambda: [tracer.write([event]) for event in iter(tracequeue.get, None)])
+            tracethread.start()
+        pool = multiprocessing.Pool(jobs, initializer=init_worker, initargs=(args.inventoryfile, args.systems, descriptions, args.verbose,
+                                                                             args.cache, cachesize, args.plots, tracequeue, budget,
+                                                                             args.memo_size))
+        # Languages with the same inventory run together, so only the first one of them searches. The most expensive
+        # groups are started first, so that none of them is left running alone at the end. Each result is written as
+        # soon as it arrives, so finished languages are never held back by slower ones started before them
+        groups = group_tasks(tasks) if args.memo_size else [[i] for i in range(len(tasks))]
+        costs = []
+        for group in groups:
+            language, family, inventory, todo = tasks[group[0]]
+            costs.append(sum(language_cost(systems[name], inventory) for name in todo) + len(group))
+        order = longest_first(costs)
+        results = (pair for pairs in pool.imap_unordered(analyse_systems_worker, ([(i, tasks[i]) for i in groups[g]] for g in order))
+                   for pair in pairs)
 
-inventoryfile = sys.argv[1]
-fd, allsegments = readinventory(inventoryfile)
-df = pd.read_csv('phonemic_inventories/pb_languages_formatted.csv')
-all_languages = {}
-for index, row in tqdm(df.iterrows()):
-    language = row['language'].replace("/", " or ")
-    family = row['family']
-    inventory = row['core inventory']
-    inventory = inventory.strip("[]").split(',')
-    inventory = [feature.strip().replace("'", "") for feature in inventory]
-    inventory = [feature for feature in inventory if feature != '']
-    allsegments = set(inventory)
+    for i, languageresults in tqdm(results, total=len(tasks)):
+        language, family, inventory, todo = tasks[i]
+        for name, (info, phonemeplots) in zip(todo, languageresults):
+            writers[name].write(language, family, info, positions[i])
+            if name in plotwriters:
+                plotwriters[name].write(language, family, {'plots': phonemeplots}, positions[i])
+    for writer in writers.values():
+        writer.close()
 
-    minimal_natural_classes = []
-    minimal_natural_classes_perphoneme = {}
-    natural_classes = []
-    natural_classes_perphoneme = {}
-    for testset in tqdm(allsegments):
-        features = [f for f in fd]
-        base = allsegments
-        feats, modes = [], [] # list with featres, list with signs for each feature
-        testset = {testset}
-
-        # Iterate over all features to find:
-            # base: list of phonemes that are described by the same features as the given test phoneme
-            # feats: list of features that describe the given phoneme
-            # modes: list with the respective signs of the features describing the given phoneme
-        for feat in features:
-            if testset <= fd[feat]['+']: # test whether testset is a subset of fd[feat]['+']
-                # fd[feat]['+']: set of phonemes that have the feature feat with sign + 
-                base = base & fd[feat]['+'] # returns intersection between the two sets (those elements that are in both sets)
-                feats.append(feat)
-                modes.append('+')
-            elif testset <= fd[feat]['-']:
-                # fd[feat]['-']: set of phonemes that have the feature feat with sign - 
-                base = base & fd[feat]['-']
-                feats.append(feat)
-                modes.append('-')
-
-        solutions = {}
-        # Check if the procedure above has resulted in the phoneme being tested (i.e. we have the correct general feature description and it is a natural class)
-        if base == testset: 
-            maxlen = len(feats)
-            reccheck(fd, feats, modes, [], [], base, 0)
-            for s in solutions.values():
-                for a in s:
-                    natural_classes.append(a) 
-                    if list(testset)[0] in natural_classes_perphoneme:
-                        natural_classes_perphoneme[list(testset)[0]].append(a)
-                    else: 
-                        natural_classes_perphoneme[list(testset)[0]] = []
-            minsol = min(solutions.keys())
-            for s in solutions[minsol]:
-                minimal_natural_classes.append(s)
-                if list(testset)[0] in minimal_natural_classes_perphoneme:
-                    minimal_natural_classes_perphoneme[list(testset)[0]].append(s)
-                else: 
-                    minimal_natural_classes_perphoneme[list(testset)[0]] = []
+    for cache in caches.values():
+        cache.close()
+    if jobs != 1:
+        pool.close()
+        pool.join()
+        if tracer is not None:
+            tracequeue.put(None) # every event of the workers is on the queue once they have exited
+            tracethread.join()
+    if tracer is not None:
+        tracer.close()
 
-    min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths = get_general_info_natural_classes(natural_classes_perphoneme, list(fd.keys()))
-    all_languages[language] = {'min_lengths': min_lengths, 'min_descriptions': min_descriptions, 
-                                'count_phoneme': count_phoneme, 'avg_lengths': avg_lengths, 'count_lengths': count_lengths}
+    for name, plotwriter in plotwriters.items():
+        plotwriter.close()
+        render_plots(plotfiles[name], name, jobs)
 
-with open(f'data_all_languages_{inventoryfile}.json', 'w') as file:
-    json.dump(all_languages, file)
\ No newline at end of file
+    if args.json:
+        for name in names:
+            tojson(f'data_all_languages_{name}.jsonl', f'data_all_languages_{name}.json')
@@ -1,276 +1,231 @@
-import sys
-import matplotlib.pyplot as plt
+import argparse
+import multiprocessing
+import threading
 import os
 import json
-
-def readinventory(filename):
-    """Read phoneme inventory and store in a dictionary."""
-    featdict = {}
-    allsegments = set()
-
-    lines = [line.strip() for line in open(f'feature_sets/{filename}.txt')]
-    fields = lines[0].split()
-    for f in fields:
-        featdict[f] = {}
-        featdict[f]['name'] = f # name of the feature
-        featdict[f]['+'] = set() # phonemes with a + for that feature
-        featdict[f]['-'] = set() # phonemes with a - for that feature
-    for i in range(1, len(lines)):
-        thisline = lines[i]
-        if len(thisline) == 0:
-            continue
-        linefields = thisline.split()
-        if len(linefields)!= len(fields) + 1 :
-            print(f"Field length mismatch on line {i+1}")
-            quit()
-        phoneme = linefields[0]
-        allsegments |= {phoneme}
-        for j in range(1,len(linefields)):
-            if linefields[j] == '+' or linefields[j] == '-':
-                featdict[fields[j-1]][linefields[j]] |= {phoneme}
-
-    return featdict, allsegments
-
-def reccheck(fd, basefeats, basemodes, feats, modes, correct, baseindex):
+from featurematrix import FeatureMatrix, DescriptionStore
+from featurestore import load_featuresystem
+from search import Budget, greedy, greedy_batch, minimal_only
+from schedule import phoneme_cost, longest_first, in_order
+from cache import ResultCache, cached_reccheck
+from plotting import plot_phonemes, render_plots
+from stats import get_general_info_natural_classes
+from resultstream import ResultWriter
+from tracing import Tracer, start_event, phoneme_event, language_event
+import time
+
+# Fields of the output that only depend on the minimum descriptions, the ones computed with --minimal-only
+MINIMAL_FIELDS = ['min_descriptions', 'count_phoneme', 'count_lengths']
+
+def analyse_phoneme(fm, phoneme, descriptions, verbose, cache=None, trace=None, budget=None, greedy_description=None, language='all'):
     """
-    Start with an empty set of features and keep adding features one by one with different starting phonemes, generating all possible unique feature combinations.
-    Check if the generated feature combinations are natural classes for the given phoneme.
+    Run the branch-and-bound search for one phoneme of language, along with its greedy description (greedy_description,
+    if already found by greedy_batch), which bounds the search with descriptions='minimum' (--minimal-only), where only
+    the minimum descriptions are searched. With a Budget, the search stops when it runs out and the result is marked as
+    incomplete. trace is a function called with the trace events as soon as they happen (a start event, then the timed
+    and counted search, which is also returned under 'trace'), or None to trace nothing.
     """
-
-    def store_feats(fd, feats, modes):
-        """Store features for one solution in dictionary indexed by length."""
-        global solutions
-        length = len(feats)
-        if length not in solutions:
-            solutions[length] = []
-        thissol = []
-        for idx, feat in enumerate(feats):
-            thissol.append(modes[idx] + fd[feat]['name'])
-        solutions[length].append('[' + ','.join(thissol) + ']')
-        if verbose:
-            print('[' + ','.join(thissol) + ']')
-            
-    def check_feats(fd, feats, modes, correct):
-        """Check if proposed feature combination is a valid solution."""
-        newbase = allsegments
-        for idx, feat in enumerate(feats):
-            mode = modes[idx]
-            newbase = newbase & fd[feat][mode]
-        if newbase != correct:
-            return False
-        return True
-        
-    global maxlen
-    if len(feats) > maxlen: # Bound the search (max: total amount of features)
-        return
-    if check_feats(fd, feats, modes, correct): # New solution
-        store_feats(fd, feats, modes) # if proposed feature combination is a natural class, store solution
-        if len(feats) < maxlen:
-            maxlen = len(feats)
-    numelem = len(basefeats)
-    # This for loop iterates over all possible indeces and generates all possible feature combinations
-    for i in range(baseindex, numelem):  # Add one feature
-        if basefeats[i] not in feats:    # If we didn't add this already
-            reccheck(fd, basefeats, basemodes, feats + [basefeats[i]], modes + [basemodes[i]], correct, i + 1)
-    return
-
-def greedy(fd, basefeats, basemodes, correct):
-    """Implement greedy search based on C."""
-    feats = []
-    modes = []
-    currentset = allsegments
-    bestfeatures = []
-    # Find most distinguishing feature
-    while True:
-        sols = []
-        if verbose:
-            print("===============================")
-        for f,m in zip(basefeats, basemodes):
-            extrasegs = (currentset & fd[f][m]) - correct
-            length = len(extrasegs)
-            if verbose:
-                print("Len of " + fd[f]['name'] + " is " + str(length))
-            sols.append((extrasegs, fd[f]['name'], length, m))
-        bestsol = min(sols, key = lambda x: x[2])
-        currentset = bestsol[0]
-        bestfeatures.append(bestsol[3] + bestsol[1])
-
-        if bestsol[2] == 0:
-            break
-    print("Greedy solution:", bestfeatures)
-
-def get_general_info_natural_classes(natural_classes, keys):
-    """Get descriptive information for the given natural classes"""
-    if not os.path.exists(f'{language}_perphoneme_{inventoryfile}'):
-        os.makedirs(f'{language}_perphoneme_{inventoryfile}')
-
-    min_lengths = {} # store the length of the minimal description where each feature is included
-    min_lengths_phonemes = {}
-    avg_lengths = {key: [0,0] for key in keys} # store the average lengths of all descriptions per phoneme
-
-    for phoneme in natural_classes:
-        for sublist in natural_classes[phoneme]:
-            sublist = sublist.strip("[]").split(',')
-            # Iterate through each unique value
-            for value in sublist:
-                value = value.strip('+') # remove + symbols
-                value = value.strip('-') # remove - symbols
-                # Check if the value already exists in the dictionary
-                if value in min_lengths:
-                    # If the length of the current sublist is smaller than the stored length,
-                    # update the stored length
-                    min_lengths[value] = min(min_lengths[value], len(sublist))
-                else:
-                    # If the value doesn't exist in the dictionary, add it with the length
-                    min_lengths[value] = len(sublist)
-
-                if value in avg_lengths:
-                    avg_lengths[value][0] += len(sublist)
-                    avg_lengths[value][1] += 1
-            
-            if phoneme in min_lengths_phonemes:
-                min_lengths_phonemes[phoneme] = min(min_lengths_phonemes[phoneme], len(sublist))
-            else: 
-                min_lengths_phonemes[phoneme] = len(sublist)
-        
-        aux_plotting_function(min_lengths, f"Phoneme {phoneme}", 'Feature', 'Length minimal feature description', f'{language}_perphoneme_{inventoryfile}/{phoneme}.jpg', False)
-                
-    avg_lengths = {k: v[0] / v[1] if v[1] != 0 else 0 for k, v in avg_lengths.items()}
-
-    min_descriptions = {} # store the minimal descriptions of each phoneme
-    # get all minimal descriptions per phoneme
-    for phoneme in natural_classes:
-        if phoneme not in min_descriptions:
-            min_descriptions[phoneme] = []
-
-        for sublist in natural_classes[phoneme]:
-            sublist = sublist.strip("[]").split(',')
-            if min_lengths_phonemes[phoneme] == len(sublist):
-                min_descriptions[phoneme].append(sublist)
-
-    count_phoneme = {} # The number of times the feature is included in the minimal description of a phoneme
-    count_lengths = {} # Count of minimal descriptions for various lengths
-    # count features in minimal descriptions          
-    for phoneme in min_descriptions:
-        for sublist in min_descriptions[phoneme]:
-            for value in sublist:
-                value = value.strip('+') # remove + symbol
-                value = value.strip('-') # remove - symbol
-                if value in count_phoneme:
-                    count_phoneme[value] += 1
-                else:
-                    count_phoneme[value] = 1
-    
-            if len(sublist) in count_lengths:
-                count_lengths[len(sublist)] += 1
-            else:
-                count_lengths[len(sublist)] = 1
-    
-    return min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths
-
-def aux_plotting_function(values, title, xlabel, ylabel, path, xint):
-    """Plot the given variables."""
-    values = dict(sorted(values.items(), key=lambda item: item[1]))
-    classes = list(values.keys())
-    counts = list(values.values())
-
-    # Plot the histogram
-    plt.bar(classes, counts, width=0.8)
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    if xint: plt.locator_params(axis="x", integer=True)
-    else: plt.xticks(rotation=90)
-    plt.savefig(path, bbox_inches='tight')
-    plt.close()
-
-##############################################################################
-
-if len(sys.argv) < 2:
-    print("Usage: " + sys.argv[0] + " [-v] inventoryfile phonemeset")
-    quit()
-
-verbose = False
-i = 1
-if sys.argv[1] == '-v':
-    verbose = True
-    i += 1
-
-inventoryfile = sys.argv[i]
-fd, allsegments = readinventory(inventoryfile)
-
-if len(sys.argv) == 3:
-    language = sys.argv[2]
-    with open(f"phonemic_inventories/{language}.txt", "r") as file:
-        lines = file.readlines()
-    selected_segments = [line.strip() for line in lines]
-    allsegments = set(selected_segments)
-
-minimal_natural_classes = []
-minimal_natural_classes_perphoneme = {}
-natural_classes = []
-natural_classes_perphoneme = {}
-print(allsegments)
-
-for testset in allsegments:
-    print(testset)
-    features = [f for f in fd]
-    base = allsegments
-    feats, modes = [], [] # list with featres, list with signs for each feature
-    testset = set(testset)
-    print("Calculating C for phoneme set " + "{" + ','.join(testset) + "}")
-
-    # Iterate over all features to find:
-        # base: list of phonemes that are described by the same features as the given test phoneme
+    testset = set(phoneme)
+    # Find:
+        # base: mask of phonemes that are described by the same features as the given test phoneme
         # feats: list of features that describe the given phoneme
         # modes: list with the respective signs of the features describing the given phoneme
-    for feat in features:
-        if testset <= fd[feat]['+']: # test whether testset is a subset of fd[feat]['+']
-            # fd[feat]['+']: set of phonemes that have the feature feat with sign + 
-            base = base & fd[feat]['+'] # returns intersection between the two sets (those elements that are in both sets)
-            print("+" + fd[feat]['name'], end=' ')
-            feats.append(feat)
-            modes.append('+')
-        elif testset <= fd[feat]['-']:
-            # fd[feat]['-']: set of phonemes that have the feature feat with sign - 
-            base = base & fd[feat]['-']
-            print("-" + fd[feat]['name'], end=' ')
-            feats.append(feat)
-            modes.append('-')
-    print()
+    base, feats, modes = fm.specified(testset)
+    result = {'testset': testset, 'feats': feats, 'modes': modes, 'plus': fm.signmask(feats, modes), 'solutions': None, 'greedy': None, 'trace': None, 'incomplete': False}
 
-    solutions = {}
     # Check if the procedure above has resulted in the phoneme being tested (i.e. we have the correct general feature description and it is a natural class)
-    if base == testset: 
+    if testset <= fm.index.keys() and base == fm.tomask(testset):
+        if greedy_description is None or testset != {phoneme}:
+            greedy_description = greedy(fm, feats, modes, base)
+        if trace:
+            trace(start_event(language, phoneme=phoneme))
+        counters = {} if trace else None
+        t = time.perf_counter() if trace else None
+        if descriptions == 'minimum':
+            result['solutions'] = minimal_only(fm, feats, modes, base, verbose, counters, len(greedy_description))
+        else:
+            result['solutions'] = cached_reccheck(cache, fm, feats, modes, base, descriptions == 'minimal', verbose, counters, budget)
+            result['incomplete'] = budget is not None and budget.exhausted
+        if trace:
+            result['trace'] = phoneme_event(language, phoneme, feats, time.perf_counter() - t, counters, result['solutions'])
+            trace(result['trace'])
+        result['greedy'] = greedy_description
+    return result
+
+def report_phoneme(fm, phoneme, result):
+    """Print the search results of one phoneme."""
+    testset = result['testset']
+    print(phoneme)
+    print("Calculating C for phoneme set " + "{" + ','.join(sorted(testset)) + "}")
+    for feat, mode in zip(result['feats'], result['modes']):
+        print(mode + fm.fd[feat]['name'], end=' ')
+    print()
+    if result['solutions'] is not None:
         print("Set is a natural class")
         print("Trying branch-and-bound")
-        maxlen = len(feats)
-        reccheck(fd, feats, modes, [], [], base, 0)
-        for s in solutions.values():
-            for a in s:
-                natural_classes.append(a) 
-                if list(testset)[0] in natural_classes_perphoneme:
-                    natural_classes_perphoneme[list(testset)[0]].append(a)
-                else: 
-                    natural_classes_perphoneme[list(testset)[0]] = []
-        minsol = min(solutions.keys())
-        print("Minimal solution(s):")
-        for s in solutions[minsol]:
-            print(s)
-            minimal_natural_classes.append(s)
-            if list(testset)[0] in minimal_natural_classes_perphoneme:
-                minimal_natural_classes_perphoneme[list(testset)[0]].append(s)
-            else: 
-                minimal_natural_classes_perphoneme[list(testset)[0]] = []
+        print("Minimal solution(s):" + (" (incomplete search)" if result['incomplete'] else ""))
+        for s in result['solutions'][min(result['solutions'].keys())]:
+            print(fm.format(s, result['plus']))
         print("Trying greedy search")
-        greedy(fd, feats, modes, base)
+        print("Greedy solution:", result['greedy'])
     else:
         # The given phoneme does not have a feature description that distinguishes it from all the other phonemes (i.e. does not have a natural class)
         print("Set is not a natural class")
 
-min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths = get_general_info_natural_classes(natural_classes_perphoneme, list(fd.keys()))
-all_info = {'min_lengths': min_lengths, 'min_descriptions': min_descriptions, 
-                                'count_phoneme': count_phoneme, 'avg_lengths': avg_lengths, 'count_lengths': count_lengths}
+# State of each worker process, set once by init_worker instead of being pickled with every task
+worker = {}
 
-with open(f'info_{inventoryfile}_{language}.json', 'w') as file:
-    json.dump(all_info, file)
+def init_worker(fm, descriptions, verbose, inventoryfile, cachedir, cachesize, tracequeue, budget, language):
+    """
+    Store the feature matrix and search options (and open the result cache) once per worker process. The trace events
+    are put on tracequeue (if given) as they happen, for the main process to write.
+    """
+    worker['fm'] = fm
+    worker['descriptions'] = descriptions
+    worker['verbose'] = verbose
+    worker['cache'] = ResultCache(cachedir, inventoryfile, fm.fd, cachesize) if cachedir else None
+    worker['trace'] = tracequeue.put if tracequeue is not None else None
+    worker['budget'] = budget
+    worker['language'] = language
+
+def analyse_phoneme_worker(indexedphoneme):
+    """
+    Run analyse_phoneme for one (index, phoneme, greedy) tuple inside a worker process, returning the index with the
+    result.
+    """
+    index, phoneme, greedy_description = indexedphoneme
+    result = analyse_phoneme(worker['fm'], phoneme, worker['descriptions'], worker['verbose'], worker['cache'], worker['trace'],
+                             worker['budget'], greedy_description, worker['language'])
+    if worker['cache'] is not None:
+        worker['cache'].commit()
+    return index, result
+
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-v', dest='verbose', action='store_true', help='print every description found')
+    parser.add_argument('--descriptions', choices=['all', 'minimal'], default='all',
+                        help='all: every description found by the exhaustive search; minimal: only irredundant descriptions')
+    parser.add_argument('--minimal-only', action='store_true',
+                        help='only search the minimum descriptions and only output min_descriptions, count_phoneme and count_lengths (no cache, no plots)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes (0: one per CPU core)')
+    parser.add_argument('--cache', metavar='DIR', help='directory of the on-disk cache of search results (default: no cache)')
+    parser.add_argument('--cache-size', type=int, default=1024, help='maximum size of the cache in MB')
+    parser.add_argument('--max-nodes', type=int, help='stop the search of a phoneme after this many nodes and mark it as incomplete')
+    parser.add_argument('--max-seconds', type=float, help='stop the search of a phoneme after this many seconds and mark it as incomplete')
+    parser.add_argument('--plots', choices=['none', 'deferred', 'inline'],
+                        help='per-phoneme plots: none; deferred: store the plot data and render it in parallel at the end; inline: render one by one (default, none with --minimal-only)')
+    parser.add_argument('--trace', metavar='FILE', help='write a JSON-lines trace of the search of every phoneme, and print the slowest ones at the end')
+    parser.add_argument('--trace-top', type=int, default=10, help='number of slowest phonemes in the trace summary')
+    parser.add_argument('inventoryfile', help='feature system in feature_sets/, e.g. riggle')
+    parser.add_argument('language', nargs='?', help='phonemic inventory in phonemic_inventories/, e.g. dutch (default: every segment of the feature system)')
+    args = parser.parse_args()
+    if args.minimal_only and args.descriptions == 'minimal':
+        parser.error('--minimal-only reproduces the output of --descriptions all')
+    if args.minimal_only and args.plots not in (None, 'none'):
+        parser.error('--minimal-only does not compute the data of the plots')
+    if args.minimal_only and (args.max_nodes is not None or args.max_seconds is not None):
+        parser.error('--max-nodes and --max-seconds limit the exhaustive search, which --minimal-only does not run')
+    if (args.max_nodes is not None and args.max_nodes < 1) or (args.max_seconds is not None and args.max_seconds <= 0):
+        parser.error('--max-nodes and --max-seconds must be positive')
+    descriptions = 'minimum' if args.minimal_only else args.descriptions
+    budget = Budget(args.max_nodes, args.max_seconds) if args.max_nodes is not None or args.max_seconds is not None else None
+    plots = args.plots or ('none' if args.minimal_only else 'inline')
+
+    inventoryfile = args.inventoryfile
+    fd = load_featuresystem(inventoryfile)
+    allsegments = set(fd.segments)
+
+    language = 'all'
+    if args.language is not None:
+        language = args.language
+        with open(f"phonemic_inventories/{language}.txt", "r") as file:
+            lines = file.readlines()
+        selected_segments = [line.strip() for line in lines]
+        allsegments = set(selected_segments)
+
+    print(allsegments)
+
+    fm = FeatureMatrix(fd, allsegments) # bitmask representation of the feature dictionary for the selected segments
+    natural_classes = DescriptionStore(fm.features) # descriptions of each phoneme, as packed masks
+    incomplete = [] # phonemes whose search ran out of budget
+    greedy_descriptions = {} # greedy description of each natural class
+    phonemes = sorted(allsegments) # fixed order, so serial and parallel runs report the phonemes identically
+    greedies = greedy_batch(fm) # greedy description of every phoneme, found at once
+
+    jobs = args.jobs or os.cpu_count()
+    cachesize = args.cache_size * 1024 ** 2
+    tracer = None
+    if args.trace:
+        tracer = Tracer(args.trace, args.trace_top, script='featureinfo_selectlanguages', inventoryfile=inventoryfile,
+                        language=language, descriptions=descriptions, jobs=jobs)
+        start = time.perf_counter()
+        events = []
+    trace = tracer is not None
+    cache = None
+    if jobs == 1:
+        cache = ResultCache(args.cache, inventoryfile, fd, cachesize) if args.cache else None
+        emit = (lambda event: tracer.write([event])) if trace else None
+        results = (analyse_phoneme(fm, phoneme, descriptions, args.verbose, cache, emit, budget, greedies[phoneme], language) for phoneme in phonemes)
+    else:
+        # The workers send their trace events through a queue, written by a thread of the main process as they arrive
+        tracequeue = multiprocessing.Queue() if trace else None
+        if trace:
+            tracethread = threading.Thread(target=lambda: [tracer.write([event]) for event in iter(tracequeue.get, None)])
+            tracethread.start()
+        pool = multiprocessing.Pool(jobs, initializer=init_worker, initargs=(fm, descriptions, args.verbose, inventoryfile, args.cache, cachesize,
+                                                                             tracequeue, budget, language))
+        # The most expensive phonemes are started first and the results are put back in the order of phonemes
+        order = longest_first([phoneme_cost(fm, phoneme) for phoneme in phonemes])
+        results = in_order(pool.imap_unordered(analyse_phoneme_worker, ((i, phonemes[i], greedies[phonemes[i]]) for i in order)))
+
+    for phoneme, result in zip(phonemes, results):
+        report_phoneme(fm, phoneme, result)
+        solutions = result['solutions']
+        if solutions is None:
+            continue
+        if trace:
+            events.append(result['trace'])
+        if result['incomplete']:
+            incomplete.append(phoneme)
+        greedy_descriptions[phoneme] = result['greedy']
+        # The statistics have always left out the first description of every phoneme
+        # Keyed by the phoneme searched, since the test set of a multi-character segment is the set of its characters
+        natural_classes.add(phoneme, [a for s in solutions.values() for a in s][1:], result['plus'])
+
+    if cache is not None:
+        cache.close()
+    if jobs != 1:
+        pool.close()
+        pool.join()
+        if trace:
+            tracequeue.put(None) # every event of the workers is on the queue once they have exited
+            tracethread.join()
+
+    if trace:
+        searchtime = time.perf_counter() - start
+    min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths, phonemeplots = get_general_info_natural_classes(natural_classes)
+    if trace:
+        elapsed = time.perf_counter() - start
+        tracer.write([language_event(language, len(allsegments), elapsed, searchtime, elapsed - searchtime, events)])
+        tracer.close()
+    all_info = {'min_lengths': min_lengths, 'min_descriptions': min_descriptions, 
+                                    'count_phoneme': count_phoneme, 'avg_lengths': avg_lengths, 'count_lengths': count_lengths}
+    if descriptions == 'minimum':
+        all_info = {field: all_info[field] for field in MINIMAL_FIELDS}
+    if incomplete:
+        all_info['incomplete'] = incomplete
+    all_info['greedy'] = greedy_descriptions
+
+    with open(f'info_{inventoryfile}_{language}.json', 'w') as file:
+        json.dump(all_info, file)
+
+    if plots == 'inline':
+        plot_phonemes(language, inventoryfile, phonemeplots)
+    elif plots == 'deferred':
+        plotfile = f'info_{inventoryfile}_{language}_plots.jsonl'
+        plotwriter = ResultWriter(plotfile)
+        plotwriter.write(language, None, {'plots': phonemeplots})
+        plotwriter.close()
+        render_plots(plotfile, inventoryfile, jobs)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import numpy as np
+
+def readinventory(filename):
+    """Read phoneme inventory and store in a dictionary."""
+    featdict = {}
+    allsegments = set()
+
+    lines = [line.strip() for line in open(f'feature_sets/{filename}.txt')]
+    fields = lines[0].split()
+    for f in fields:
+        featdict[f] = {}
+        featdict[f]['name'] = f # name of the feature
+        featdict[f]['+'] = set() # phonemes with a + for that feature
+        featdict[f]['-'] = set() # phonemes with a - for that feature
+    for i in range(1, len(lines)):
+        thisline = lines[i]
+        if len(thisline) == 0:
+            continue
+        linefields = thisline.split()
+        if len(linefields)!= len(fields) + 1 :
+            print(f"Field length mismatch on line {i+1}")
+            quit()
+        phoneme = linefields[0]
+        allsegments |= {phoneme}
+        for j in range(1,len(linefields)):
+            if linefields[j] == '+' or linefields[j] == '-':
+                featdict[fields[j-1]][linefields[j]] |= {phoneme}
+
+    return featdict, allsegments
+
+class FeatureMatrix:
+    """
+    Feature dictionary compiled against one inventory.
+    Every segment of the inventory gets a bit position and every (feature, sign) pair becomes an int bitmask
+    with the bits of the segments carrying that value, so intersecting natural classes is a single AND.
+    """
+
+    def __init__(self, fd, segments):
+        self.fd = fd
+        self.features = list(fd)
+        self.featureindex = {f: j for j, f in enumerate(self.features)} # bit position of each feature in a description
+        self.segments = list(segments)
+        self.index = {seg: i for i, seg in enumerate(self.segments)} # bit position of each segment
+        self.full = (1 << len(self.segments)) - 1 # mask with every segment of the inventory
+        self.masks = {}
+        for f in fd: # only the segments of the inventory are looked at, not every segment with the value
+            self.masks[f] = {'+': self.tomask(fd[f]['+'] & self.index.keys()), '-': self.tomask(fd[f]['-'] & self.index.keys())}
+
+    def tomask(self, segments):
+        """Convert a set of segments to a bitmask (segments outside the inventory are ignored)."""
+        mask = 0
+        for seg in segments:
+            if seg in self.index:
+                mask |= 1 << self.index[seg]
+        return mask
+
+    def tosegments(self, mask):
+        """Convert a bitmask back to the set of segments it represents."""
+        segments = set()
+        while mask:
+            low = mask & -mask
+            segments.add(self.segments[low.bit_length() - 1])
+            mask ^= low
+        return segments
+
+    def specified(self, testset):
+        """
+        Find the features that describe every segment of testset.
+        Returns:
+            base: mask of the segments that share all those features with testset
+            feats: list of features that describe testset
+            modes: list with the respective signs of those features
+        """
+        base = self.full
+        feats, modes = [], []
+        for feat in self.fd:
+            if testset <= self.fd[feat]['+']: # testset is a subset of the phonemes with a + for feat
+                base &= self.masks[feat]['+']
+                feats.append(feat)
+                modes.append('+')
+            elif testset <= self.fd[feat]['-']:
+                base &= self.masks[feat]['-']
+                feats.append(feat)
+                modes.append('-')
+        return base, feats, modes
+
+    def valuearrays(self):
+        """
+        Feature-by-segment boolean arrays of the masks: plus[i, j] (minus[i, j]) is True if segment j has a + (a -) for
+        the i-th feature (by featureindex).
+        """
+        nbytes = (len(self.segments) + 7) // 8
+        arrays = []
+        for mode in '+-':
+            data = b''.join(self.masks[f][mode].to_bytes(nbytes, 'little') for f in self.features)
+            bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8).reshape(len(self.features), nbytes), axis=1, bitorder='little')
+            arrays.append(bits[:, :len(self.segments)].astype(bool))
+        return arrays[0], arrays[1]
+
+    def signmask(self, feats, modes):
+        """Mask of the features (by featureindex) that have a + in feats/modes."""
+        plus = 0
+        for feat, mode in zip(feats, modes):
+            if mode == '+':
+                plus |= 1 << self.featureindex[feat]
+        return plus
+
+    def labels(self, description, plus):
+        """Feature labels ('+f' or '-f') of a description mask, in the order of the feature system."""
+        return labels(self.features, description, plus)
+
+    def format(self, description, plus):
+        """Format a description mask as '[+f,-g]'."""
+        return '[' + ','.join(self.labels(description, plus)) + ']'
+
+def labels(features, description, plus):
+    """Feature labels ('+f' or '-f') of a description mask over features, where plus is the mask of the features with a +."""
+    result = []
+    while description:
+        low = description & -description
+        j = low.bit_length() - 1
+        result.append(('+' if plus & low else '-') + features[j])
+        description ^= low
+    return result
+
+
+def pack(descriptions, nfeatures):
+    """Pack a list of description masks over nfeatures features into a (descriptions, words) array of 64-bit words."""
+    words = max(1, (nfeatures + 63) // 64)
+    if words == 1:
+        return np.array(descriptions, dtype=np.uint64).reshape(len(descriptions), 1)
+    return np.array([[(d >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(words)] for d in descriptions],
+                    dtype=np.uint64).reshape(len(descriptions), words)
+
+def unpack(row):
+    """Description mask of one packed row."""
+    description = 0
+    for w, word in enumerate(row):
+        description |= int(word) << (64 * w)
+    return description
+
+class DescriptionStore:
+    """
+    Descriptions of the phonemes of an inventory, kept as one packed array of description masks per phoneme
+    (see pack) together with the mask of the features that have a + for the phoneme.
+    The descriptions are only formatted as '[+f,-g]' labels when the results are written.
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.descriptions = {} # packed descriptions of each phoneme, in the order they were found
+        self.signs = {} # mask of the features with a + for each phoneme
+
+    def add(self, phoneme, descriptions, plus):
+        """
+        Store the list of description masks of a phoneme. A phoneme is only stored once: raises ValueError if it is
+        already in the store, rather than replacing its descriptions.
+        """
+        if phoneme in self.descriptions:
+            raise ValueError(f'descriptions of {phoneme} already stored')
+        self.descriptions[phoneme] = pack(descriptions, len(self.features))
+        self.signs[phoneme] = plus
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def __iter__(self):
+        return iter(self.descriptions)
+
+    def __getitem__(self, phoneme):
+        """List of the description masks of a phoneme."""
+        return [unpack(row) for row in self.descriptions[phoneme]]
+
+    def labels(self, phoneme, row):
+        """Feature labels of the description in a packed row of phoneme."""
+        return labels(self.features, unpack(row), self.signs[phoneme])
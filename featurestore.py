@@ -0,0 +1,178 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Mapping
+import numpy as np
+from featurematrix import readinventory
+
+STOREDIR = 'compiled' # directory of the compiled artifacts
+LANGUAGEFILE = 'phonemic_inventories/pb_languages_formatted.csv'
+ALLFEATURESFILE = 'feature_sets/ipa2allfeatures.csv' # every feature system in one table, columns named 'SYSTEM.feature'
+
+def sourcehash(path):
+    """Hash the contents of a source file, so artifacts are rebuilt whenever it changes."""
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def compile_featuresystem(filename):
+    """
+    Parse feature_sets/{filename}.txt and store it as a compact binary artifact:
+        {filename}.npy: segment-by-feature int8 matrix, bit 1 set for '+' and bit 2 set for '-'
+        {filename}.json: features, segments (the row order of the matrix) and the hash of the source file
+    """
+    source = f'feature_sets/{filename}.txt'
+    fd, allsegments = readinventory(filename)
+    features = list(fd)
+    segments = sorted(allsegments)
+    index = {seg: i for i, seg in enumerate(segments)}
+    values = np.zeros((len(segments), len(features)), dtype=np.int8)
+    for j, f in enumerate(features):
+        values[[index[seg] for seg in fd[f]['+']], j] |= 1
+        values[[index[seg] for seg in fd[f]['-']], j] |= 2
+
+    os.makedirs(STOREDIR, exist_ok=True)
+    np.save(os.path.join(STOREDIR, f'{filename}.npy'), values)
+    with open(os.path.join(STOREDIR, f'{filename}.json'), 'w') as file:
+        json.dump({'source': sourcehash(source), 'features': features, 'segments': segments}, file)
+
+def compile_allfeatures():
+    """
+    Parse ipa2allfeatures.csv once and store it like a feature system:
+        ipa2allfeatures.npy: segment-by-column int8 matrix of every system, with the values of compile_featuresystem
+        ipa2allfeatures.json: the features and column numbers of each system, the segments and the hash of the source
+    Feature names lose their spaces, as in the .txt files of the systems.
+    """
+    with open(ALLFEATURESFILE, encoding='utf-8', newline='') as file:
+        lines = [line for line in csv.reader(file, delimiter='\t') if line]
+    systems = {}
+    for j, field in enumerate(lines[0][1:]):
+        if field:
+            system, feature = field.split('.', 1)
+            systems.setdefault(system, {'features': [], 'columns': []})
+            systems[system]['features'].append(''.join(feature.split()))
+            systems[system]['columns'].append(j)
+    segments = sorted({line[0] for line in lines[1:]})
+    index = {seg: i for i, seg in enumerate(segments)}
+    values = np.zeros((len(segments), len(lines[0]) - 1), dtype=np.int8)
+    for line in lines[1:]:
+        for j, value in enumerate(line[1:]):
+            if value == '+':
+                values[index[line[0]], j] |= 1
+            elif value == '-':
+                values[index[line[0]], j] |= 2
+
+    os.makedirs(STOREDIR, exist_ok=True)
+    np.save(os.path.join(STOREDIR, 'ipa2allfeatures.npy'), values)
+    with open(os.path.join(STOREDIR, 'ipa2allfeatures.json'), 'w') as file:
+        json.dump({'source': sourcehash(ALLFEATURESFILE), 'systems': systems, 'segments': segments}, file)
+
+def compile_languages():
+    """Tokenize the inventories of pb_languages_formatted.csv once and store them as languages.json."""
+    import pandas as pd
+    df = pd.read_csv(LANGUAGEFILE)
+    languages = []
+    for index, row in df.iterrows():
+        language = row['language'].replace("/", " or ")
+        inventory = row['core inventory']
+        inventory = inventory.strip("[]").split(',')
+        inventory = [feature.strip().replace("'", "") for feature in inventory]
+        inventory = [feature for feature in inventory if feature != '']
+        languages.append([language, row['family'], inventory])
+
+    os.makedirs(STOREDIR, exist_ok=True)
+    with open(os.path.join(STOREDIR, 'languages.json'), 'w') as file:
+        json.dump({'source': sourcehash(LANGUAGEFILE), 'languages': languages}, file)
+
+def uptodate(metafile, source):
+    """Check whether a compiled artifact exists and was built from the current source file."""
+    if not os.path.exists(metafile):
+        return False
+    with open(metafile) as file:
+        return json.load(file)['source'] == sourcehash(source)
+
+class FeatureStore(Mapping):
+    """
+    Feature system loaded from a compiled artifact.
+    The matrix is memory-mapped and the store behaves like the dictionary returned by readinventory:
+    store[f] gives the name of feature f and the sets of phonemes with a + and a - for it, built on first access.
+    Args:
+        features, segments: feature names and segments of the system
+        values: segment-by-column matrix of the artifact
+        columns: column of each feature in values (default: the columns in order)
+    """
+
+    def __init__(self, features, segments, values, columns=None):
+        self.features = features
+        self.segments = segments
+        self.values = values
+        self.columns = dict(zip(features, columns if columns is not None else range(len(features))))
+        self.featdict = {}
+
+    def __getitem__(self, feat):
+        if feat not in self.featdict:
+            column = self.values[:, self.columns[feat]]
+            self.featdict[feat] = {'name': feat,
+                                   '+': {self.segments[i] for i in np.flatnonzero(column & 1)},
+                                   '-': {self.segments[i] for i in np.flatnonzero(column & 2)}}
+        return self.featdict[feat]
+
+    def __iter__(self):
+        return iter(self.features)
+
+    def contenthash(self):
+        """Hash of the features and their values for every segment, the same whichever file the system was compiled from."""
+        content = hashlib.sha256(json.dumps([self.features, self.segments], ensure_ascii=False).encode('utf-8'))
+        content.update(np.ascontiguousarray(self.values[:, [self.columns[f] for f in self.features]]).tobytes())
+        return content.hexdigest()
+
+    def __len__(self):
+        return len(self.features)
+
+def featuresystems():
+    """Names of the feature systems of feature_sets/, the names of its .txt files (e.g. HC_features)."""
+    return sorted(name[:-len('.txt')] for name in os.listdir('feature_sets') if name.endswith('.txt'))
+
+def load_featuresystem(filename):
+    """Load a feature system from its compiled artifact, compiling it first if the text file changed."""
+    if not uptodate(os.path.join(STOREDIR, f'{filename}.json'), f'feature_sets/{filename}.txt'):
+        compile_featuresystem(filename)
+    with open(os.path.join(STOREDIR, f'{filename}.json')) as file:
+        meta = json.load(file)
+    return FeatureStore(meta['features'], meta['segments'], np.load(os.path.join(STOREDIR, f'{filename}.npy'), mmap_mode='r'))
+
+def allfeatures_systems():
+    """Names of the feature systems in ipa2allfeatures.csv, compiling the table first if it changed."""
+    if not uptodate(os.path.join(STOREDIR, 'ipa2allfeatures.json'), ALLFEATURESFILE):
+        compile_allfeatures()
+    with open(os.path.join(STOREDIR, 'ipa2allfeatures.json')) as file:
+        return list(json.load(file)['systems'])
+
+def load_allfeatures(systems=None):
+    """
+    Load the feature systems of ipa2allfeatures.csv (default: all of them) from one compiled artifact, compiling it
+    first if the table changed. Returns a dictionary with the FeatureStore of each system, which share the mapped matrix.
+    """
+    if not uptodate(os.path.join(STOREDIR, 'ipa2allfeatures.json'), ALLFEATURESFILE):
+        compile_allfeatures()
+    with open(os.path.join(STOREDIR, 'ipa2allfeatures.json')) as file:
+        meta = json.load(file)
+    values = np.load(os.path.join(STOREDIR, 'ipa2allfeatures.npy'), mmap_mode='r')
+    return {system: FeatureStore(meta['systems'][system]['features'], meta['segments'], values, meta['systems'][system]['columns'])
+            for system in (systems if systems is not None else meta['systems'])}
+
+def load_languages():
+    """Load the (language, family, inventory) list, compiling it first if the csv file changed."""
+    if not uptodate(os.path.join(STOREDIR, 'languages.json'), LANGUAGEFILE):
+        compile_languages()
+    with open(os.path.join(STOREDIR, 'languages.json')) as file:
+        return json.load(file)['languages']
+
+if __name__ == '__main__':
+    # Compile the given feature systems (default: all of them) and the language inventories
+    names = sys.argv[1:] or sorted(f[:-len('.txt')] for f in os.listdir('feature_sets') if f.endswith('.txt'))
+    for name in names:
+        compile_featuresystem(name)
+    compile_allfeatures()
+    compile_languages()
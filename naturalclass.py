@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+from featurematrix import FeatureMatrix
+from featurestore import load_featuresystem, load_languages
+from search import mincover
+
+def load_inventory(language):
+    """
+    Segments of a language: a file in phonemic_inventories/ or one of the languages of pb_languages_formatted.csv.
+    Only the names of those files and languages are accepted (not paths); raises KeyError for any other name.
+    """
+    if f'{language}.txt' in os.listdir('phonemic_inventories'):
+        with open(f'phonemic_inventories/{language}.txt', 'r') as file:
+            return [line.strip() for line in file if line.strip()]
+    for name, family, inventory in load_languages():
+        if name == language:
+            return inventory
+    raise KeyError(language)
+
+class ClassQuery:
+    """
+    Natural-class queries for arbitrary sets of segments of one inventory.
+    A set is a natural class if the features that all its segments share describe no other segment. The features a set
+    shares are the (feature, sign) pairs that all its segments have, so each segment gets a signature mask of its pairs
+    and the signature of a set is the AND of those of its segments. Sets with the same signature have the same
+    features and the same natural class, which are computed once per signature, and the descriptions of that class are
+    searched once, the first time a set turns out to be the class itself.
+    """
+
+    def __init__(self, fd, inventory):
+        self.fm = FeatureMatrix(fd, set(inventory))
+        fm = self.fm
+        # Pair 2j is (feature j, '+') and pair 2j + 1 is (feature j, '-')
+        self.pairs = [(f, m) for f in fm.features for m in '+-']
+        self.signatures = {}
+        for seg, i in fm.index.items():
+            signature = 0
+            for p, (f, m) in enumerate(self.pairs):
+                if fm.masks[f][m] >> i & 1:
+                    signature |= 1 << p
+            self.signatures[seg] = signature
+        self.classes = {} # natural class, features and signs of each signature queried so far
+        self.descriptions = {} # minimum descriptions of each signature whose class was queried
+
+    def specified(self, signature):
+        """Natural class (mask) described by the features of a signature, with those features and their signs."""
+        fm = self.fm
+        base = fm.full
+        feats, modes = [], []
+        for j, f in enumerate(fm.features):
+            for m, p in (('+', 2 * j), ('-', 2 * j + 1)): # a feature with both signs counts as +, as in FeatureMatrix.specified
+                if signature >> p & 1:
+                    base &= fm.masks[f][m]
+                    feats.append(f)
+                    modes.append(m)
+                    break
+        return base, feats, modes
+
+    def query(self, segments):
+        """
+        Check whether a set of segments of the inventory is a natural class.
+        Returns a dictionary with:
+            natural_class: whether the set is a natural class
+            min_descriptions: its minimum feature descriptions (empty if it is not a natural class)
+            closure: the smallest natural class that contains the set (the set itself if it is one)
+        Raises ValueError if segments is not a collection of segments (strings), e.g. a single string, or if any of
+        them is not in the inventory.
+        """
+        if not isinstance(segments, (list, tuple, set, frozenset)) or not all(isinstance(seg, str) for seg in segments):
+            raise ValueError("segments must be a list of segments (strings)")
+        segments = set(segments)
+        unknown = segments - self.fm.index.keys()
+        if unknown:
+            raise ValueError(f"segments not in the inventory: {' '.join(sorted(unknown))}")
+        if not segments:
+            raise ValueError("empty set of segments")
+        signature = -1
+        for seg in segments:
+            signature &= self.signatures[seg]
+        if signature not in self.classes:
+            self.classes[signature] = self.specified(signature)
+        base, feats, modes = self.classes[signature]
+        natural = base == self.fm.tomask(segments)
+        if natural and signature not in self.descriptions:
+            plus = self.fm.signmask(feats, modes)
+            solutions = mincover(self.fm, feats, modes, base)
+            self.descriptions[signature] = [self.fm.labels(description, plus) for description in next(iter(solutions.values()))]
+        return {'natural_class': natural, 'min_descriptions': self.descriptions[signature] if natural else [],
+                'closure': sorted(self.fm.tosegments(base))}
+
+    def batch(self, segmentsets):
+        """Answer query for every set of segments of an iterable, in order."""
+        for segments in segmentsets:
+            yield self.query(segments)
+
+def query_classes(inventoryfile, language, segmentsets):
+    """Answer query for every set of segments of a language under the feature system of feature_sets/{inventoryfile}.txt."""
+    return list(ClassQuery(load_featuresystem(inventoryfile), load_inventory(language)).batch(segmentsets))
+
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check whether sets of segments of a language are natural classes.')
+    parser.add_argument('inventoryfile', help='feature system in feature_sets/, e.g. HC_features')
+    parser.add_argument('language', help='language file in phonemic_inventories/ (e.g. dutch) or language of pb_languages_formatted.csv')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='JSON-lines file with one set per line, as a list of segments or an object with a "segments" list '
+                             '(its other fields are copied to the answer); default: standard input')
+    parser.add_argument('-o', '--output', default='-', help='JSON-lines file of the answers (default: standard output)')
+    args = parser.parse_args()
+
+    try:
+        inventory = load_inventory(args.language)
+    except KeyError:
+        parser.error(f'unknown language {args.language}')
+    classes = ClassQuery(load_featuresystem(args.inventoryfile), inventory)
+    infile = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            record = {'error': f'invalid JSON: {error}'}
+        else:
+            if not isinstance(record, dict):
+                record = {'segments': record}
+            if 'segments' not in record:
+                record['error'] = 'missing segments'
+            else:
+                try:
+                    record.update(classes.query(record['segments']))
+                except ValueError as error:
+                    record['error'] = str(error)
+        outfile.write(json.dumps(record, ensure_ascii=False) + '\n')
+        outfile.flush() # answers are streamed as they are computed
+    if outfile is not sys.stdout:
+        outfile.close()
@@ -0,0 +1,63 @@
+import argparse
+import multiprocessing
+import os
+from resultstream import iter_results
+
+# Figure reused by every plot of this process, created on first use (matplotlib is only imported when plotting)
+renderer = {}
+
+def aux_plotting_function(values, title, xlabel, ylabel, path, xint):
+    """Plot the given variables."""
+    if not renderer:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        renderer['figure'] = Figure()
+        FigureCanvasAgg(renderer['figure'])
+        renderer['axes'] = renderer['figure'].add_subplot()
+    ax = renderer['axes']
+    ax.clear()
+
+    values = dict(sorted(values.items(), key=lambda item: item[1]))
+    classes = list(values.keys())
+    counts = list(values.values())
+
+    # Plot the histogram
+    ax.bar(classes, counts, width=0.8)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    if xint: ax.locator_params(axis="x", integer=True)
+    else: ax.tick_params(axis="x", labelrotation=90)
+    renderer['figure'].savefig(path, bbox_inches='tight')
+
+def plot_phonemes(language, inventoryfile, plots):
+    """Plot the minimal description lengths per feature stored for each phoneme of a language."""
+    os.makedirs(f'{language}_perphoneme_{inventoryfile}', exist_ok=True)
+    for phoneme, min_lengths in plots:
+        aux_plotting_function(min_lengths, f"Phoneme {phoneme}", 'Feature', 'Length minimal feature description', f'{language}_perphoneme_{inventoryfile}/{phoneme}.jpg', False)
+
+def plot_phonemes_task(task):
+    """Run plot_phonemes for one (language, inventoryfile, plots) task inside a worker process."""
+    plot_phonemes(*task)
+    return task[0]
+
+def render_plots(path, inventoryfile, jobs=1, chunksize=16):
+    """Render the plots of every language stored in a plot data file written with --plots deferred."""
+    # Split the languages into chunks of phonemes, so a single large language is also spread over the workers
+    tasks = ((language, inventoryfile, info['plots'][i:i + chunksize])
+             for language, family, info in iter_results(path) for i in range(0, len(info['plots']), chunksize))
+    if jobs == 1:
+        for task in tasks:
+            plot_phonemes_task(task)
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            for language in pool.imap_unordered(plot_phonemes_task, tasks):
+                pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes (0: one per CPU core)')
+    parser.add_argument('plotfile', help='plot data written with --plots deferred, e.g. data_all_languages_HC_features_plots.jsonl')
+    parser.add_argument('inventoryfile', help='feature system the plot data was computed with, e.g. HC_features')
+    args = parser.parse_args()
+    render_plots(args.plotfile, args.inventoryfile, args.jobs or os.cpu_count())
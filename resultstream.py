@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+
+def indexpath(path):
+    return path + '.index'
+
+def in_position(entries):
+    """Index entries sorted by the position of their language (entries without one keep their place in the index)."""
+    return [entry for i, entry in sorted(enumerate(entries), key=lambda item: item[1][4] if len(item[1]) > 4 else item[0])]
+
+def read_index(path):
+    """
+    Read the index of a results file: a list of [language, family, offset, length] entries, one per record, in the
+    order the records were written, with the position of the language when it was given to ResultWriter.write.
+    The index is written after each record, so a record without an entry (e.g. after a crash) does not count as done.
+    """
+    entries = []
+    if not os.path.exists(indexpath(path)):
+        return entries
+    with open(indexpath(path), encoding='utf-8') as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError: # Incomplete last line
+                break
+    return entries
+
+class ResultWriter:
+    """
+    Append one JSON line per language to a results file as soon as it is computed.
+    Languages can be written in any order: each one can be given its position (e.g. in pb_languages_formatted.csv),
+    and the records are read back in the order of their positions.
+    Opening an existing file keeps the records listed in its index and discards anything written after them,
+    so a run can be resumed after a crash.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        entries = read_index(path) if resume else []
+        self.done = {entry[0] for entry in entries}
+        end = entries[-1][2] + entries[-1][3] if entries else 0
+        mode = 'r+b' if resume and os.path.exists(path) else 'wb'
+        self.file = open(path, mode)
+        self.file.truncate(end)
+        self.file.seek(end)
+        self.index = open(indexpath(path), 'w', encoding='utf-8')
+        for entry in entries:
+            self.index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index.flush()
+
+    def write(self, language, family, info, position=None):
+        """Append the information of one language, at the given position in the order of the records."""
+        record = {'language': language, 'family': family}
+        record.update(info)
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        offset = self.file.tell()
+        self.file.write(line)
+        self.file.flush()
+        entry = [language, family, offset, len(line)] + ([position] if position is not None else [])
+        self.index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index.flush()
+        self.done.add(language)
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+def readrecord(file, entry):
+    """Read the record of one index entry from an open results file."""
+    file.seek(entry[2])
+    record = json.loads(file.read(entry[3]).decode('utf-8'))
+    del record['language'], record['family']
+    return record
+
+def iter_results(path, family=None):
+    """
+    Iterate over the (language, family, info) records of a results file in the order of their positions, optionally
+    only those of one family.
+    """
+    with open(path, 'rb') as file:
+        for entry in in_position(read_index(path)):
+            if family is None or entry[1] == family:
+                yield entry[0], entry[1], readrecord(file, entry)
+
+def load_language(path, language):
+    """Load the information of a single language without parsing the rest of the file."""
+    with open(path, 'rb') as file:
+        for entry in read_index(path):
+            if entry[0] == language:
+                return readrecord(file, entry)
+    raise KeyError(language)
+
+def tojson(path, jsonpath):
+    """Write the records of a results file as one JSON dictionary indexed by language (the format of results/)."""
+    all_languages = {language: info for language, family, info in iter_results(path)}
+    with open(jsonpath, 'w') as file:
+        json.dump(all_languages, file)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: " + sys.argv[0] + " results.jsonl results.json")
+        quit()
+    tojson(sys.argv[1], sys.argv[2])
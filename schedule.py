@@ -0,0 +1,40 @@
+import math
+from featurematrix import FeatureMatrix
+from search import first_description
+
+def phoneme_cost(fm, phoneme):
+    """
+    Estimated cost of the search of one phoneme of the inventory of fm (0 if it is not a natural class).
+    The exhaustive search never goes deeper than its first description, the shortest prefix of the features of the
+    phoneme that describes it, so the number of combinations of the k features that are not longer than that one
+    bounds the search; it grows exponentially with k and follows the measured search time well.
+    """
+    if phoneme not in fm.index:
+        return 0
+    base, feats, modes = fm.specified({phoneme})
+    if base != fm.tomask({phoneme}):
+        return 0
+    depth = first_description(fm, feats, modes, base).bit_count()
+    return sum(math.comb(len(feats), j) for j in range(depth + 1))
+
+def language_cost(fd, inventory):
+    """Estimated cost of the analysis of a language: the cost of its phonemes plus one unit per segment."""
+    fm = FeatureMatrix(fd, set(inventory))
+    return len(fm.segments) + sum(phoneme_cost(fm, phoneme) for phoneme in fm.segments)
+
+def longest_first(costs):
+    """Indices of the tasks of the given costs from the most to the least expensive (ties in their order)."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+def in_order(results):
+    """
+    Reorder (index, result) pairs that arrive in any order (e.g. from imap_unordered over longest_first) and yield the
+    results in the order of their indices as soon as all the previous ones have arrived.
+    """
+    pending = {}
+    following = 0
+    for index, result in results:
+        pending[index] = result
+        while following in pending:
+            yield pending.pop(following)
+            following += 1
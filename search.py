@@ -0,0 +1,428 @@
+import itertools
+import time
+import numpy as np
+
+class Exhausted(Exception):
+    """Raised inside a search when its Budget has run out."""
+
+class Budget:
+    """
+    Limits of a search: at most nodes search nodes and seconds of time (None for no limit).
+    A search given a budget stops when it runs out and sets exhausted, returning the descriptions found so far.
+    The same budget can be given to one search after another; each one starts with the full budget.
+    """
+    CHECK = 4096 # nodes between two readings of the clock
+
+    def __init__(self, nodes=None, seconds=None):
+        self.nodes = nodes
+        self.seconds = seconds
+        self.exhausted = False
+
+    def start(self):
+        """Start a search, returning its first checkpoint."""
+        self.exhausted = False
+        self.deadline = time.perf_counter() + self.seconds if self.seconds is not None else None
+        return self.following(0)
+
+    def following(self, nodes):
+        """Node count of the check after the one at nodes."""
+        limit = nodes + self.CHECK if self.deadline is not None else float('inf')
+        return min(limit, self.nodes) if self.nodes is not None else limit
+
+    def checkpoint(self, nodes):
+        """Node count at which the search checks the budget again, or raise Exhausted if it has run out."""
+        if (self.nodes is not None and nodes >= self.nodes) or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            self.exhausted = True
+            raise Exhausted
+        return self.following(nodes)
+
+def reccheck(fm, basefeats, basemodes, correct, minimal=False, verbose=False, counters=None, reduce=True, budget=None):
+    """
+    Branch-and-bound search for the feature descriptions of a natural class.
+    Features are added one by one in the order of basefeats, carrying the intersection of the chosen features down the tree.
+    Args:
+        fm: FeatureMatrix of the inventory
+        basefeats, basemodes: features (and signs) that describe the natural class
+        correct: mask of the natural class
+        minimal: if True, only return minimal (irredundant) descriptions, i.e. descriptions where no feature can be dropped.
+            Otherwise reproduce the descriptions found by the original exhaustive search: every combination, in depth-first
+            order, that is a solution and is not longer than the shortest solution found so far
+        counters: optional dictionary in which the search statistics are accumulated: the number of visited nodes ('nodes')
+            and of branches cut by the length bound ('pruned_bound'), because the remaining features cannot reach the
+            natural class ('pruned_infeasible') or because the feature does not exclude anything ('pruned_redundant'),
+            and 'incomplete' if the budget ran out
+        reduce: if True (and minimal), search one representative of each group of reduce_features and expand the result
+        budget: optional Budget of the search. When it runs out, the descriptions found so far are returned (or the first
+            description, if none was found yet) and budget.exhausted is set
+    Returns:
+        solutions: dictionary indexed by length with the list of descriptions of that length.
+            Each description is an int with bit j set if the j-th feature of the feature system is used
+            (its sign is the one of the natural class)
+    """
+    if minimal and reduce:
+        return reduced(reccheck, fm, basefeats, basemodes, correct, verbose, counters, True, budget=budget)
+    masks = [fm.masks[f][m] for f, m in zip(basefeats, basemodes)]
+    bits = [1 << fm.featureindex[f] for f in basefeats]
+    plus = fm.signmask(basefeats, basemodes)
+    numelem = len(masks)
+    # suffix[i]: intersection of all features from i onwards, the smallest set any branch starting at i can reach
+    suffix = [fm.full] * (numelem + 1)
+    for i in range(numelem - 1, -1, -1):
+        suffix[i] = suffix[i + 1] & masks[i]
+
+    solutions = {}
+    chosen = [] # indices of the features in the current branch
+    nodes = 0 # number of nodes of the search tree visited
+    bounded = infeasible = redundant = 0 # number of pruned branches, by reason
+    checkpoint = budget.start() if budget is not None else float('inf') # node count of the next check of the budget
+
+    def store_feats():
+        """Store features for one solution in dictionary indexed by length."""
+        description = 0
+        for i in chosen:
+            description |= bits[i]
+        solutions.setdefault(len(chosen), []).append(description)
+        if verbose:
+            print(fm.format(description, plus))
+
+    def irredundant():
+        """Check that no feature of the current solution can be dropped."""
+        n = len(chosen)
+        right = [fm.full] * (n + 1) # right[j]: intersection of chosen[j:]
+        for j in range(n - 1, -1, -1):
+            right[j] = right[j + 1] & masks[chosen[j]]
+        left = fm.full
+        for j in range(n):
+            if left & right[j + 1] == correct: # chosen[j] is redundant
+                return False
+            left &= masks[chosen[j]]
+        return True
+
+    def allsearch(current, baseindex):
+        nonlocal maxlen, nodes, bounded, infeasible, checkpoint
+        nodes += 1
+        if nodes >= checkpoint:
+            checkpoint = budget.checkpoint(nodes)
+        if current == correct: # New solution, every extension is longer so stop descending
+            store_feats()
+            maxlen = len(chosen)
+            return
+        for i in range(baseindex, numelem): # Add one feature
+            if len(chosen) + 1 > maxlen: # Bound the search
+                bounded += 1
+                return
+            if current & suffix[i] != correct: # No combination of the remaining features reaches the natural class
+                infeasible += 1
+                return
+            chosen.append(i)
+            allsearch(current & masks[i], i + 1)
+            chosen.pop()
+
+    def minimalsearch(current, baseindex):
+        nonlocal nodes, infeasible, redundant, checkpoint
+        for i in range(baseindex, numelem): # Add one feature
+            if current & suffix[i] != correct: # No combination of the remaining features reaches the natural class
+                infeasible += 1
+                return
+            newbase = current & masks[i]
+            if newbase == current: # Feature does not exclude anything, so it is redundant in every description below
+                redundant += 1
+                continue
+            chosen.append(i)
+            nodes += 1
+            if nodes >= checkpoint:
+                checkpoint = budget.checkpoint(nodes)
+            if newbase == correct:
+                if irredundant():
+                    store_feats()
+            else:
+                minimalsearch(newbase, i + 1)
+            chosen.pop()
+
+    try:
+        if minimal:
+            nodes += 1 # root
+            if fm.full == correct:
+                store_feats()
+            else:
+                minimalsearch(fm.full, 0)
+        else:
+            maxlen = numelem # Bound the search (max: total amount of features)
+            allsearch(fm.full, 0)
+    except Exhausted:
+        if not solutions: # fall back on the first description, made irredundant in minimal mode
+            chosen = [i for i in range(numelem) if first_description(fm, basefeats, basemodes, correct) & bits[i]]
+            if minimal:
+                for i in list(chosen):
+                    rest = fm.full
+                    for j in chosen:
+                        if j != i:
+                            rest &= masks[j]
+                    if rest == correct:
+                        chosen.remove(i)
+            store_feats()
+    if counters is not None:
+        for name, value in (('nodes', nodes), ('pruned_bound', bounded), ('pruned_infeasible', infeasible), ('pruned_redundant', redundant)):
+            counters[name] = counters.get(name, 0) + value
+        if budget is not None and budget.exhausted:
+            counters['incomplete'] = counters.get('incomplete', 0) + 1
+    return solutions
+
+def reduce_features(fm, basefeats, basemodes):
+    """
+    Group the features of a natural class by the segments of the inventory they keep.
+    A feature that keeps every segment never excludes anything, so it is redundant in every description and left out.
+    Features that keep the same segments are interchangeable: an irredundant (or minimum) description uses at most one
+    of them, and any of them in its place.
+    Returns:
+        groups: list with the positions in basefeats of the features of each group, in the order of their first feature
+    """
+    groups = {}
+    for i, (f, m) in enumerate(zip(basefeats, basemodes)):
+        mask = fm.masks[f][m]
+        if mask != fm.full:
+            groups.setdefault(mask, []).append(i)
+    return list(groups.values())
+
+def reduced(search, fm, basefeats, basemodes, correct, verbose, counters, *args, **options):
+    """
+    Run search (reccheck in minimal mode or mincover) on the first feature of each group of reduce_features and expand
+    every description found into the descriptions with each choice of the features of its groups.
+    The descriptions are returned in the depth-first order of the unreduced search, i.e. sorted by their positions in
+    basefeats. The number of features left out of the search is accumulated in counters under 'reduced_features'.
+    """
+    groups = reduce_features(fm, basefeats, basemodes)
+    feats = [basefeats[group[0]] for group in groups]
+    modes = [basemodes[group[0]] for group in groups]
+    solutions = search(fm, feats, modes, correct, *args, counters=counters, reduce=False, **options)
+    if counters is not None:
+        counters['reduced_features'] = counters.get('reduced_features', 0) + len(basefeats) - len(groups)
+    groupof = {1 << fm.featureindex[f]: group for f, group in zip(feats, groups)}
+    bits = [1 << fm.featureindex[f] for f in basefeats]
+    plus = fm.signmask(basefeats, basemodes)
+    expanded = {}
+    for length, descriptions in solutions.items():
+        choices = []
+        for description in descriptions:
+            members = []
+            while description:
+                low = description & -description
+                members.append(groupof[low])
+                description ^= low
+            choices.extend(sorted(choice) for choice in itertools.product(*members))
+        expanded[length] = []
+        for choice in sorted(choices):
+            description = 0
+            for i in choice:
+                description |= bits[i]
+            expanded[length].append(description)
+            if verbose:
+                print(fm.format(description, plus))
+    return expanded
+
+def first_description(fm, basefeats, basemodes, correct):
+    """
+    First description found by the exhaustive search of reccheck. The search always descends into the first feasible
+    feature, so this is the shortest prefix of basefeats that describes the natural class.
+    """
+    current = fm.full
+    description = 0
+    for f, m in zip(basefeats, basemodes):
+        if current == correct:
+            break
+        current &= fm.masks[f][m]
+        description |= 1 << fm.featureindex[f]
+    return description
+
+def mincover(fm, basefeats, basemodes, correct, upper=None, verbose=False, counters=None, reduce=True):
+    """
+    Find the minimum-size descriptions of a natural class directly, without enumerating the longer ones.
+    A description has to exclude every segment outside the natural class, and feature i excludes the segments outside
+    masks[i], so the minimum descriptions are the minimum covers of those segments by the features: a set-cover problem.
+    The size is deepened one by one from a lower bound up to upper (by default the size of the greedy description),
+    branching at each node on the features that exclude the remaining segment with the fewest such features.
+    Args:
+        fm, basefeats, basemodes, correct: as in reccheck
+        upper: size of a known description, the largest size searched
+        counters: optional dictionary in which the number of visited nodes ('nodes') and of branches cut by the
+            lower bound ('pruned_bound') or because a segment cannot be excluded ('pruned_infeasible') are accumulated
+        reduce: if True, search one representative of each group of reduce_features and expand the result
+    Returns:
+        solutions: dictionary with the minimum length and the list of descriptions of that length, in the order of reccheck
+    """
+    if reduce:
+        return reduced(mincover, fm, basefeats, basemodes, correct, verbose, counters, upper)
+    excluded = [fm.full & ~fm.masks[f][m] for f, m in zip(basefeats, basemodes)] # segments excluded by each feature
+    bits = [1 << fm.featureindex[f] for f in basefeats]
+    plus = fm.signmask(basefeats, basemodes)
+    numelem = len(excluded)
+    target = fm.full & ~correct
+    if target == 0:
+        return {0: [0]}
+    if upper is None:
+        upper = len(greedy(fm, basefeats, basemodes, correct))
+    # options[j]: mask of the features that exclude segment j
+    options = [0] * len(fm.segments)
+    for i in range(numelem):
+        rest = excluded[i]
+        while rest:
+            low = rest & -rest
+            options[low.bit_length() - 1] |= 1 << i
+            rest ^= low
+
+    found = [] # sorted feature indices of each cover found
+    chosen = []
+    nodes = bounded = infeasible = 0
+
+    def lowerbound(uncovered, allowed):
+        """Smallest number of the allowed features that can exclude every uncovered segment, counting segments only."""
+        sizes = []
+        while allowed:
+            low = allowed & -allowed
+            sizes.append((excluded[low.bit_length() - 1] & uncovered).bit_count())
+            allowed ^= low
+        sizes.sort(reverse=True)
+        remaining = uncovered.bit_count()
+        for k, size in enumerate(sizes):
+            if size == 0:
+                break
+            remaining -= size
+            if remaining <= 0:
+                return k + 1
+        return numelem + 1
+
+    def search(uncovered, allowed, left):
+        nonlocal nodes, bounded, infeasible
+        nodes += 1
+        if uncovered == 0:
+            found.append(sorted(chosen))
+            return
+        if lowerbound(uncovered, allowed) > left:
+            bounded += 1
+            return
+        # Branch on the uncovered segment that the fewest allowed features exclude
+        branch = None
+        rest = uncovered
+        while rest:
+            low = rest & -rest
+            candidates = options[low.bit_length() - 1] & allowed
+            if branch is None or candidates.bit_count() < branch.bit_count():
+                branch = candidates
+                if branch == 0:
+                    infeasible += 1
+                    return
+            rest ^= low
+        # Every cover containing the segment uses one of the candidates: the first of them (in feature order) in turn,
+        # so each cover is found exactly once
+        while branch:
+            low = branch & -branch
+            i = low.bit_length() - 1
+            allowed &= ~low
+            chosen.append(i)
+            search(uncovered & ~excluded[i], allowed, left - 1)
+            chosen.pop()
+            branch ^= low
+
+    everything = (1 << numelem) - 1
+    for size in range(lowerbound(target, everything), upper + 1): # iterative deepening
+        search(target, everything, size)
+        if found:
+            break
+    if counters is not None:
+        for name, value in (('nodes', nodes), ('pruned_bound', bounded), ('pruned_infeasible', infeasible)):
+            counters[name] = counters.get(name, 0) + value
+    descriptions = []
+    for cover in sorted(found): # depth-first order of reccheck
+        description = 0
+        for i in cover:
+            description |= bits[i]
+        descriptions.append(description)
+        if verbose:
+            print(fm.format(description, plus))
+    return {len(found[0]): descriptions}
+
+def minimal_only(fm, basefeats, basemodes, correct, verbose=False, counters=None, upper=None):
+    """
+    Solutions of reccheck restricted to what the minimal statistics depend on, for --minimal-only.
+    These are the minimum descriptions (from mincover, bounded by upper or else by the greedy description), preceded by
+    the first description of the exhaustive search if that one is longer, since the drivers leave out the first
+    description of every phoneme.
+    """
+    if upper is None:
+        upper = len(greedy(fm, basefeats, basemodes, correct))
+    solutions = mincover(fm, basefeats, basemodes, correct, upper, verbose, counters)
+    first = first_description(fm, basefeats, basemodes, correct)
+    length = first.bit_count()
+    if length not in solutions:
+        solutions = {length: [first], **solutions}
+    return solutions
+
+def greedy(fm, basefeats, basemodes, correct, verbose=False):
+    """Implement greedy search based on C."""
+    currentset = fm.full
+    bestfeatures = []
+    # Find most distinguishing feature
+    while True:
+        sols = []
+        if verbose:
+            print("===============================")
+        for f,m in zip(basefeats, basemodes):
+            extrasegs = currentset & fm.masks[f][m] & ~correct
+            length = extrasegs.bit_count()
+            if verbose:
+                print("Len of " + fm.fd[f]['name'] + " is " + str(length))
+            sols.append((extrasegs, fm.fd[f]['name'], length, m))
+        bestsol = min(sols, key = lambda x: x[2])
+        currentset = bestsol[0]
+        bestfeatures.append(bestsol[3] + bestsol[1])
+
+        if bestsol[2] == 0:
+            break
+    return bestfeatures
+
+def greedy_batch(fm, phonemes=None, size=2 ** 22):
+    """
+    Run greedy for every phoneme of the inventory of fm (or the given ones) at once, with array operations.
+    The segments that agree with a phoneme on a feature are the segments with its value, so there are only two masks
+    per feature, the rows of the value arrays of fm. Every step counts, for all the phonemes together, the segments left
+    in each of those masks with one matrix product and takes for each phoneme its feature with the fewest (the first one
+    on ties, like greedy). The phonemes are processed in chunks of about size segments, so the full feature tables fit
+    in memory.
+    Returns:
+        dictionary with the greedy description of each phoneme, as the list of its features ('+f' or '-f') in the order
+        they were chosen, the same as greedy, or None if the phoneme is not a natural class
+    """
+    if phonemes is None:
+        phonemes = fm.segments
+    plus, minus = fm.valuearrays()
+    nfeatures, nsegments = plus.shape
+    masks = np.concatenate([plus, minus]) # row i: segments with a + for feature i, row nfeatures + i: with a -
+    weights = masks.T.astype(np.float32)
+    indices = [fm.index[phoneme] for phoneme in phonemes]
+    chunk = max(1, size // max(1, nsegments))
+    result = {}
+    for start in range(0, len(indices), chunk):
+        rows = np.array(indices[start:start + chunk], dtype=np.int64)
+        isplus = plus[:, rows].T # (phonemes, features): the features with a + for each phoneme
+        isminus = minus[:, rows].T & ~isplus # a phoneme with both values counts as +, like in fm.specified
+        specified = isplus | isminus
+        value = np.where(isplus, np.arange(nfeatures), np.arange(nfeatures) + nfeatures) # row of masks of each feature
+        # A phoneme is a natural class if every other segment differs from it on one of its specified features
+        differ = isplus.astype(np.float32) @ (~plus).astype(np.float32) + isminus.astype(np.float32) @ (~minus).astype(np.float32)
+        natural = (differ > 0).sum(axis=1) == nsegments - 1
+        current = np.ones((len(rows), nsegments), dtype=bool) # segments not excluded yet (fm.full & ~correct)
+        current[np.arange(len(rows)), rows] = False
+        chosen = [[] for row in rows]
+        active = np.flatnonzero(natural)
+        while len(active):
+            counts = np.take_along_axis(current[active].astype(np.float32) @ weights, value[active], axis=1)
+            counts[~specified[active]] = np.inf
+            best = counts.argmin(axis=1)
+            for k, i in zip(active, best):
+                chosen[k].append(i)
+            current[active] &= masks[value[active, best]]
+            active = active[counts[np.arange(len(active)), best] > 0]
+        for k, row in enumerate(rows):
+            phoneme = fm.segments[row]
+            result[phoneme] = [('+' if isplus[k, i] else '-') + fm.features[i] for i in chosen[k]] if natural[k] else None
+    return result
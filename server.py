@@ -0,0 +1,126 @@
+import argparse
+import json
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from engine import Engine, MODES
+from featurestore import featuresystems
+
+class QueryServer(HTTPServer):
+    """
+    Local HTTP server that keeps an Engine per feature system in memory and answers JSON queries:
+        GET /describe?system=S&language=L&phoneme=X[&descriptions=minimum|minimal|all]
+        GET /classes?system=S&language=L&segments=a,b,c (one set) or POST /classes with {"system", "language", "sets"}
+    Requests are answered one at a time, so the engines are never used concurrently. Only the feature systems of
+    feature_sets/ are served, and a system that fails to load only fails its requests.
+    """
+
+    def __init__(self, address, systems=(), verbose=False):
+        super().__init__(address, QueryHandler)
+        self.verbose = verbose
+        self.engines = {} # Engine of each feature system, loaded on first use
+        for system in systems:
+            self.engine(system)
+
+    def engine(self, system):
+        """
+        Engine of a feature system, loaded on first use.
+        Raises KeyError for a system that is not in feature_sets/ and RuntimeError for one that cannot be loaded.
+        """
+        if system not in self.engines:
+            if system not in featuresystems():
+                raise KeyError(f'unknown feature system {system}')
+            try:
+                self.engines[system] = Engine(system)
+            except SystemExit: # readinventory quits on a malformed file
+                raise RuntimeError(f'cannot load feature system {system}: malformed file')
+            except Exception as error:
+                raise RuntimeError(f'cannot load feature system {system}: {error}')
+        return self.engines[system]
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def reply(self, status, answer):
+        body = json.dumps(answer, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def answer(self, path, params):
+        """
+        Answer of a query, or raise KeyError (unknown system, language or path), ValueError (bad query) or RuntimeError
+        (feature system that cannot be loaded).
+        """
+        for name in ('system', 'language'):
+            if name not in params:
+                raise ValueError(f'missing parameter {name}')
+        engine = self.server.engine(params['system'])
+        if path == '/describe':
+            if 'phoneme' not in params:
+                raise ValueError('missing parameter phoneme')
+            return engine.describe(params['phoneme'], params['language'], params.get('descriptions', 'minimum'))
+        if path == '/classes':
+            if 'sets' in params:
+                sets = params['sets']
+                if not isinstance(sets, list) or not all(isinstance(segments, list) and all(isinstance(seg, str) for seg in segments)
+                                                          for segments in sets):
+                    raise ValueError('sets must be a list of lists of segments (strings)')
+            elif 'segments' in params:
+                sets = [params['segments'].split(',')]
+            else:
+                raise ValueError('missing parameter segments')
+            return engine.classes(sets, params['language'])
+        raise KeyError(f'unknown path {path}')
+
+    def handle_query(self, path, params):
+        try:
+            self.reply(200, self.answer(path, params))
+        except KeyError as error:
+            self.reply(404, {'error': f'not found: {error.args[0]}'})
+        except (ValueError, TypeError) as error:
+            self.reply(400, {'error': str(error)})
+        except RuntimeError as error:
+            self.reply(500, {'error': str(error)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.handle_query(url.path, {name: values[-1] for name, values in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.reply(400, {'error': 'invalid Content-Length'})
+            return
+        try:
+            params = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as error:
+            self.reply(400, {'error': f'invalid JSON: {error}'})
+            return
+        self.handle_query(urlparse(self.path).path, params)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Answer description and natural-class queries over HTTP, keeping the feature systems loaded.')
+    parser.add_argument('-v', dest='verbose', action='store_true', help='log every request')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('systems', nargs='*', help='feature systems in feature_sets/ to load at startup (others are loaded on first use)')
+    args = parser.parse_args()
+    unknown = sorted(set(args.systems) - set(featuresystems()))
+    if unknown:
+        parser.error(f"unknown feature systems {', '.join(unknown)} (feature_sets/ has {', '.join(featuresystems())})")
+
+    server = QueryServer((args.host, args.port), args.systems, args.verbose)
+    print(f"Listening on http://{args.host}:{args.port} (descriptions: {', '.join(MODES)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,71 @@
+import numpy as np
+from featurematrix import pack
+
+def membership(packed, nfeatures):
+    """Boolean description-by-feature matrix of packed description masks (see featurematrix.pack)."""
+    octets = np.ascontiguousarray(packed, dtype='<u8').view(np.uint8) # little-endian, so bit j is bit j % 8 of octet j // 8
+    return np.unpackbits(octets, axis=1, count=nfeatures, bitorder='little').view(bool)
+
+def firstseen(rows, nfeatures):
+    """Features present in the rows of a membership matrix, in order of first appearance (then feature order)."""
+    if len(rows) == 0:
+        return []
+    present = rows.any(axis=0)
+    first = rows.argmax(axis=0)
+    return [j for j in np.lexsort((np.arange(nfeatures), first)) if present[j]]
+
+def get_general_info_natural_classes(natural_classes):
+    """
+    Get descriptive information for the given natural classes.
+    Args:
+        natural_classes: DescriptionStore with the descriptions of each phoneme
+    """
+    features = natural_classes.features
+    nfeatures = len(features)
+    phonemes = list(natural_classes)
+    counts = np.array([len(natural_classes.descriptions[phoneme]) for phoneme in phonemes], dtype=int)
+    packed = np.concatenate([natural_classes.descriptions[phoneme] for phoneme in phonemes]) if phonemes else pack([], nfeatures)
+    rows = membership(packed, nfeatures) # one row per description
+    lengths = rows.sum(axis=1, dtype=np.min_scalar_type(nfeatures + 1)) # smallest type with room for the sentinel below
+    ends = np.cumsum(counts) # descriptions of phoneme p are rows ends[p] - counts[p] up to ends[p]
+    nonempty = counts > 0
+    none = np.iinfo(lengths.dtype).max # length of a feature that does not occur
+
+    # Shortest description of each phoneme that includes each feature, and the running minimum over the phonemes
+    # (min_lengths after each phoneme, the data of the per-phoneme plots)
+    featurelengths = np.where(rows, lengths[:, None], none)
+    perphoneme = np.full((len(phonemes), nfeatures), none, dtype=lengths.dtype)
+    if nonempty.any():
+        perphoneme[nonempty] = np.minimum.reduceat(featurelengths, (ends - counts)[nonempty], axis=0)
+    running = np.minimum.accumulate(perphoneme, axis=0)
+    order = firstseen(rows, nfeatures) # min_lengths lists the features in the order they are first seen
+    first = rows.argmax(axis=0) if len(rows) else np.zeros(nfeatures, dtype=int)
+    plots = []
+    for p, phoneme in enumerate(phonemes):
+        plots.append((phoneme, {features[j]: int(running[p, j]) for j in order if first[j] < ends[p]}))
+    min_lengths = plots[-1][1] if plots else {} # store the length of the minimal description where each feature is included
+
+    # store the average lengths of all descriptions per phoneme
+    total = [int(lengths[rows[:, j]].sum(dtype=int)) for j in range(nfeatures)]
+    occurrences = rows.sum(axis=0)
+    avg_lengths = {features[j]: float(total[j] / occurrences[j]) if occurrences[j] != 0 else 0 for j in range(nfeatures)}
+
+    # get all minimal descriptions per phoneme
+    shortest = np.zeros(len(phonemes), dtype=int)
+    if nonempty.any():
+        shortest[nonempty] = np.minimum.reduceat(lengths, (ends - counts)[nonempty])
+    minimal = lengths == np.repeat(shortest, counts)
+    min_descriptions = {} # store the minimal descriptions of each phoneme
+    for p, phoneme in enumerate(phonemes):
+        min_descriptions[phoneme] = [natural_classes.labels(phoneme, row)
+                                     for row in packed[ends[p] - counts[p]:ends[p]][minimal[ends[p] - counts[p]:ends[p]]]]
+
+    # count features in minimal descriptions
+    minrows = rows[minimal]
+    occurrences = minrows.sum(axis=0)
+    count_phoneme = {features[j]: int(occurrences[j]) for j in firstseen(minrows, nfeatures)} # The number of times the feature is included in the minimal description of a phoneme
+    minlengths = lengths[minimal]
+    values, firstindex, histogram = np.unique(minlengths, return_index=True, return_counts=True)
+    count_lengths = {int(values[i]): int(histogram[i]) for i in np.argsort(firstindex)} # Count of minimal descriptions for various lengths
+
+    return min_lengths, min_descriptions, count_phoneme, avg_lengths, count_lengths, plots
@@ -0,0 +1,90 @@
+import heapq
+import json
+import sys
+import time
+
+def start_event(language, segments=None, phoneme=None):
+    """Trace event written when the analysis of a language (with its number of segments) or of one of its phonemes starts."""
+    if phoneme is None:
+        return {'event': 'language_start', 'language': language, 'segments': segments}
+    return {'event': 'phoneme_start', 'language': language, 'phoneme': phoneme}
+
+def phoneme_event(language, phoneme, feats, elapsed, counters, solutions):
+    """Trace event of the search of one phoneme, from the counters filled by reccheck/cached_reccheck."""
+    return {'event': 'phoneme', 'language': language, 'phoneme': phoneme, 'features': len(feats),
+            'reduced_features': counters.get('reduced_features', 0), 'time': elapsed,
+            'nodes': counters.get('nodes', 0), 'pruned_bound': counters.get('pruned_bound', 0),
+            'pruned_infeasible': counters.get('pruned_infeasible', 0), 'pruned_redundant': counters.get('pruned_redundant', 0),
+            'cached': counters.get('cache_hits', 0) > 0, 'incomplete': counters.get('incomplete', 0) > 0,
+            'solutions': {length: len(descriptions) for length, descriptions in sorted(solutions.items())}}
+
+def language_event(language, segments, elapsed, searchtime, statstime, phonemes):
+    """Trace event of one language, summing the events of its phonemes."""
+    return {'event': 'language', 'language': language, 'segments': segments, 'time': elapsed,
+            'search_time': searchtime, 'stats_time': statstime, 'natural_classes': len(phonemes),
+            'nodes': sum(event['nodes'] for event in phonemes),
+            'descriptions': sum(sum(event['solutions'].values()) for event in phonemes)}
+
+class Tracer:
+    """
+    Trace of a run, written as one JSON line per event.
+    The events are plain dictionaries built by the search loops (possibly in worker processes) and handed to write in
+    the main process, which also keeps the slowest languages and phonemes for the summary at the end of the run.
+    The start events written before each language and phoneme show, in a stalled run, which search has not finished.
+    """
+
+    def __init__(self, path, top=10, **meta):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.top = top
+        self.start = time.perf_counter()
+        self.languages = [] # heap of the top slowest (time, language)
+        self.phonemes = [] # heap of the top slowest (time, language, phoneme)
+        self.totals = {'languages': 0, 'phonemes': 0, 'nodes': 0, 'cached': 0}
+        self.emit({'event': 'start', 'date': time.strftime('%Y-%m-%d %H:%M:%S'), **meta})
+
+    def emit(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def keep(self, heap, item):
+        """Keep item in heap if it is among the top slowest."""
+        if len(heap) < self.top:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    def write(self, events):
+        """Write events and flush them, so the trace shows where a stalled run is."""
+        for event in events:
+            self.emit(event)
+            if event['event'] == 'phoneme':
+                self.totals['phonemes'] += 1
+                self.totals['nodes'] += event['nodes']
+                self.totals['cached'] += event['cached']
+                self.keep(self.phonemes, (event['time'], event['language'], event['phoneme']))
+            elif event['event'] == 'language':
+                self.totals['languages'] += 1
+                self.keep(self.languages, (event['time'], event['language']))
+        self.file.flush()
+
+    def summary(self):
+        """Totals of the run and its slowest languages and phonemes."""
+        return {'event': 'summary', 'time': time.perf_counter() - self.start, **self.totals,
+                'slowest_languages': [{'language': language, 'time': elapsed} for elapsed, language in sorted(self.languages, reverse=True)],
+                'slowest_phonemes': [{'language': language, 'phoneme': phoneme, 'time': elapsed}
+                                     for elapsed, language, phoneme in sorted(self.phonemes, reverse=True)]}
+
+    def close(self, out=sys.stderr):
+        """Write the summary to the trace and print it to out."""
+        summary = self.summary()
+        self.emit(summary)
+        self.file.close()
+        print(f"{summary['languages']} languages, {summary['phonemes']} phonemes ({summary['cached']} from the cache), "
+              f"{summary['nodes']} nodes in {summary['time']:.3f}s", file=out)
+        if summary['slowest_languages']:
+            print("Slowest languages:", file=out)
+            for entry in summary['slowest_languages']:
+                print(f"  {entry['time']:10.3f}s  {entry['language']}", file=out)
+        if summary['slowest_phonemes']:
+            print("Slowest phonemes:", file=out)
+            for entry in summary['slowest_phonemes']:
+                print(f"  {entry['time']:10.3f}s  {entry['language']} {entry['phoneme']}", file=out)